@@ -0,0 +1,168 @@
+"""Sustituto local de Athena para el benchmark.
+
+AthenaLocal baja de S3 los objetos que dejó la ingesta, los expone en DuckDB
+como vistas con el nombre de la tabla en el catálogo (con el mismo esquema que
+generaría ingesta.py --ddl) y ejecuta las consultas de etl/main.py sin
+cambios, salvo el prefijo "AwsDataCatalog"."catalogo". El resultado se sube a
+S3 con el formato CSV de Athena.
+
+ClienteAthena responde a las llamadas que hace etl/main.py (start, get, results,
+stop) a partir de esos resultados ya calculados, así que el ETL lee el CSV de
+S3 igual que en producción y el costo de DuckDB no se mezcla con el suyo.
+"""
+import itertools
+import os
+import time
+
+import pyarrow as pa
+
+CATALOGO_ATHENA = '"AwsDataCatalog"."catalogo".'
+FILAS_POR_LOTE = 50000
+
+# Tipos de DuckDB en el resultado -> tipos que informa Athena en ColumnInfo.
+TIPOS_ATHENA = {
+    'VARCHAR': 'varchar',
+    'BOOLEAN': 'boolean',
+    'TINYINT': 'tinyint',
+    'SMALLINT': 'smallint',
+    'INTEGER': 'integer',
+    'BIGINT': 'bigint',
+    'FLOAT': 'float',
+    'DOUBLE': 'double',
+    'DECIMAL': 'decimal',
+    'DATE': 'date',
+    'TIMESTAMP': 'timestamp',
+    'TIMESTAMP WITH TIME ZONE': 'timestamp',
+}
+
+
+def tipo_duckdb(tipo, formato):
+    # Igual que tipo_hive en ingesta.py: en JSON los timestamps se escriben
+    # como epoch en milisegundos.
+    if pa.types.is_struct(tipo):
+        campos = ', '.join(f'"{campo.name}" {tipo_duckdb(campo.type, formato)}' for campo in tipo)
+        return f'STRUCT({campos})'
+    if pa.types.is_list(tipo):
+        return f'{tipo_duckdb(tipo.value_type, formato)}[]'
+    if pa.types.is_timestamp(tipo):
+        return 'BIGINT' if formato == 'json' else 'TIMESTAMP'
+    if pa.types.is_floating(tipo):
+        return 'DOUBLE'
+    if pa.types.is_integer(tipo):
+        return 'BIGINT'
+    if pa.types.is_boolean(tipo):
+        return 'BOOLEAN'
+    return 'VARCHAR'
+
+
+def valor_csv(valor):
+    # Athena escribe los NULL como campo vacío y todo lo demás entre comillas.
+    if valor is None:
+        return ''
+    return '"' + str(valor).replace('"', '""') + '"'
+
+
+class AthenaLocal:
+    def __init__(self, s3, directorio):
+        # duckdb se importa acá para que el proceso del ETL, que solo usa
+        # ClienteAthena, no lo cargue en memoria.
+        import duckdb
+        self.s3 = s3
+        self.directorio = directorio
+        self.con = duckdb.connect()
+        self.bytes_por_tabla = {}
+
+    def registrar_tabla(self, tabla, esquema=None):
+        """Baja los objetos de la tabla y crea su vista; devuelve cuántos objetos bajó."""
+        table_name = tabla['table_name']
+        formato = tabla['output_format']
+        local = os.path.join(self.directorio, table_name)
+        paginator = self.s3.get_paginator('list_objects_v2')
+        objetos = 0
+        total = 0
+        particiones = set()
+        for page in paginator.paginate(Bucket=tabla['bucket_name'], Prefix=f'{table_name}/'):
+            for objeto in page.get('Contents', []):
+                destino = os.path.join(self.directorio, objeto['Key'])
+                os.makedirs(os.path.dirname(destino), exist_ok=True)
+                self.s3.download_file(tabla['bucket_name'], objeto['Key'], destino)
+                objetos += 1
+                total += objeto['Size']
+                # Las columnas de partición salen de la ruta (tenant_id=.../dt=...).
+                particiones.update(parte.split('=', 1)[0] for parte in objeto['Key'].split('/')[1:-1] if '=' in parte)
+        self.bytes_por_tabla[table_name.lower()] = total
+        patron = f"{local}/**/*.{formato}"
+        if formato == 'json':
+            columnas = ', '.join(f"'{campo.name}': '{tipo_duckdb(campo.type, formato)}'"
+                                 for campo in (esquema or []) if campo.name not in particiones)
+            opciones = f", columns={{{columnas}}}" if columnas else ''
+            origen = f"read_json('{patron}', format='newline_delimited', hive_partitioning=true{opciones})"
+        elif formato == 'parquet':
+            origen = f"read_parquet('{patron}', hive_partitioning=true, union_by_name=true)"
+        else:
+            raise ValueError(f'Formato sin soporte en el benchmark: {formato}')
+        self.con.execute(f'CREATE OR REPLACE VIEW "{table_name.lower()}" AS SELECT * FROM {origen}')
+        return objetos
+
+    def ejecutar(self, sql, output_location):
+        """Ejecuta la consulta y sube el CSV a output_location (s3://bucket/key)."""
+        inicio = time.perf_counter()
+        relacion = self.con.sql(sql.replace(CATALOGO_ATHENA, ''))
+        column_info = [{'Name': nombre, 'Type': TIPOS_ATHENA.get(str(tipo).split('(')[0], 'varchar')}
+                       for nombre, tipo in zip(relacion.columns, relacion.types)]
+        bucket, key = output_location[len('s3://'):].split('/', 1)
+        path = os.path.join(self.directorio, 'resultados', key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        filas = 0
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(','.join(valor_csv(col['Name']) for col in column_info) + '\n')
+            for lote in iter(lambda: relacion.fetchmany(FILAS_POR_LOTE), []):
+                f.writelines(','.join(valor_csv(valor) for valor in fila) + '\n' for fila in lote)
+                filas += len(lote)
+        segundos = time.perf_counter() - inicio
+        self.s3.upload_file(path, bucket, key)
+        leidas = sum(tamano for tabla, tamano in self.bytes_por_tabla.items() if f'"{tabla}"' in sql)
+        return {
+            'sql': sql,
+            'output_location': output_location,
+            'column_info': column_info,
+            'filas': filas,
+            'statistics': {
+                'QueryQueueTimeInMillis': 0,
+                'EngineExecutionTimeInMillis': int(segundos * 1000),
+                'TotalExecutionTimeInMillis': int(segundos * 1000),
+                'DataScannedInBytes': leidas,
+            },
+        }
+
+
+class ClienteAthena:
+    """Responde como el cliente de boto3 con los resultados de AthenaLocal.ejecutar."""
+
+    def __init__(self, resultados):
+        self.por_sql = {resultado['sql']: resultado for resultado in resultados}
+        self.por_id = {}
+        self.ids = itertools.count()
+
+    def start_query_execution(self, QueryString, **kwargs):
+        query_execution_id = f'bench-{next(self.ids)}'
+        self.por_id[query_execution_id] = self.por_sql[QueryString]
+        return {'QueryExecutionId': query_execution_id}
+
+    def get_query_execution(self, QueryExecutionId):
+        resultado = self.por_id[QueryExecutionId]
+        return {
+            'ResponseMetadata': {'RetryAttempts': 0},
+            'QueryExecution': {
+                'QueryExecutionId': QueryExecutionId,
+                'Status': {'State': 'SUCCEEDED'},
+                'Statistics': resultado['statistics'],
+                'ResultConfiguration': {'OutputLocation': resultado['output_location']},
+            },
+        }
+
+    def get_query_results(self, QueryExecutionId, MaxResults=None):
+        return {'ResultSet': {'ResultSetMetadata': {'ColumnInfo': self.por_id[QueryExecutionId]['column_info']}}}
+
+    def stop_query_execution(self, QueryExecutionId):
+        return {}
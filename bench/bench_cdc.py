@@ -0,0 +1,273 @@
+"""Prueba de punta a punta del consumidor CDC (etl/cdc.py) con streams reales.
+
+Uso: python bench/bench_cdc.py [--pedidos N] [--moto] [--timeout SEGUNDOS]
+
+Crea orderService-dev y billingService-dev con StreamViewType NEW_IMAGE,
+recrea las tablas de MySQL con mysql.sql y escribe, modifica y borra items:
+una orden que cambia de productos (OrderProductos se reemplaza), una orden
+borrada, una factura sin payment_details (defectos de TABLAS_MYSQL), una
+factura con un monto que no convierte (tiene que terminar en el dead letter sin
+frenar el shard) y --pedidos órdenes más para medir. Corre cdc_process hasta que
+el checkpoint llega al último SequenceNumber de cada shard y comprueba las filas
+de MySQL, el checkpoint y el dead letter. Después escribe un cambio más y vuelve
+a arrancar el consumidor para comprobar que sigue desde el checkpoint.
+
+DynamoDB es el de DYNAMODB_ENDPOINT_URL o AWS_ENDPOINT_URL (DynamoDB Local del
+perfil local de etl/docker-compose.yml o el moto de docker-compose.yml) o, con
+--moto, un servidor moto dentro de este proceso. MySQL es el de MYSQL_HOST,
+MYSQL_USER, ... (por defecto el MariaDB de docker-compose.yml).
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import boto3
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(RAIZ, 'bench')
+ETL_DIR = os.path.join(RAIZ, 'etl')
+
+TABLAS = {'orderService-dev': 'order_id', 'billingService-dev': 'invoice_id'}
+# Filas de MySQL que se comparan con las esperadas.
+CONSULTAS = {
+    'Orders': 'SELECT tenant_id, order_id, user_id, status FROM Orders',
+    'OrderProductos': 'SELECT order_id, product_id FROM OrderProductos',
+    'Billing': 'SELECT tenant_id, invoice_id, order_id, method, amount, status FROM Billing',
+}
+
+
+def entorno(trabajo, endpoint):
+    # Igual que bench_suite.py: credenciales de mentira y MySQL del compose.
+    for clave in ('AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY', 'AWS_SESSION_TOKEN'):
+        os.environ[clave] = 'bench'
+    os.environ.setdefault('AWS_REGION', 'us-east-1')
+    os.environ['AWS_DEFAULT_REGION'] = os.environ['AWS_REGION']
+    os.environ.setdefault('MYSQL_HOST', '127.0.0.1')
+    os.environ.setdefault('MYSQL_USER', 'root')
+    os.environ.setdefault('MYSQL_PASSWORD', 'bench')
+    os.environ.setdefault('MYSQL_DATABASE', 'bench')
+    os.environ.setdefault('MYSQL_PORT', '3306')
+    os.environ['DYNAMODB_ENDPOINT_URL'] = endpoint
+    os.environ['LOGS_DIR'] = os.path.join(trabajo, 'logs')
+    os.environ['CDC_TABLES'] = ','.join(TABLAS)
+    os.environ['CDC_CHECKPOINT_PATH'] = os.path.join(trabajo, 'cdc_checkpoint.json')
+    os.environ['CDC_DEAD_LETTER_PATH'] = os.path.join(trabajo, 'cdc_dead_letter.jsonl')
+    os.environ['CDC_START_POSITION'] = 'TRIM_HORIZON'
+    os.environ.setdefault('CDC_POLL_SECONDS', '0.2')
+    os.environ.setdefault('CDC_DISCOVERY_SECONDS', '1')
+    os.makedirs(os.environ['LOGS_DIR'], exist_ok=True)
+
+
+def crear_tablas(ddb):
+    for table_name, clave in TABLAS.items():
+        try:
+            ddb.delete_table(TableName=table_name)
+            ddb.get_waiter('table_not_exists').wait(TableName=table_name)
+        except ddb.exceptions.ResourceNotFoundException:
+            pass
+        ddb.create_table(
+            TableName=table_name,
+            KeySchema=[{'AttributeName': 'tenant_id', 'KeyType': 'HASH'},
+                       {'AttributeName': clave, 'KeyType': 'RANGE'}],
+            AttributeDefinitions=[{'AttributeName': 'tenant_id', 'AttributeType': 'S'},
+                                  {'AttributeName': clave, 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST',
+            StreamSpecification={'StreamEnabled': True, 'StreamViewType': 'NEW_IMAGE'},
+        )
+        ddb.get_waiter('table_exists').wait(TableName=table_name)
+
+
+def recrear_mysql(tablas_mysql):
+    with open(os.path.join(BENCH_DIR, 'mysql.sql'), encoding='utf-8') as f:
+        sentencias = [sql for sql in f.read().split(';') if sql.strip()]
+    connection = tablas_mysql.conectar_mysql()
+    try:
+        with connection.cursor() as cursor:
+            for sql in sentencias:
+                cursor.execute(sql)
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def productos(*pares):
+    return {'L': [{'M': {'product_id': {'S': p}, 'price': {'N': str(precio)}}} for p, precio in pares]}
+
+
+def orden(tenant, order_id, user_id, status, items):
+    return {'tenant_id': {'S': tenant}, 'order_id': {'S': order_id}, 'user_id': {'S': user_id},
+            'status': {'S': status}, 'items': items}
+
+
+def factura(tenant, invoice_id, order_id, status, pago=None):
+    item = {'tenant_id': {'S': tenant}, 'invoice_id': {'S': invoice_id}, 'order_id': {'S': order_id},
+            'status': {'S': status}}
+    if pago is not None:
+        item['payment_details'] = {'M': {'method': {'S': pago[0]}, 'amount': pago[1]}}
+    return item
+
+
+def escribir_cambios(ddb, pedidos):
+    """Escribe los cambios de la prueba y devuelve las filas que MySQL debe tener."""
+    ordenes, facturas = 'orderService-dev', 'billingService-dev'
+    ddb.put_item(TableName=ordenes, Item=orden('t1', 'o-1', 'u1', 'PENDING', productos(('p1', 10), ('p2', 5))))
+    ddb.put_item(TableName=ordenes, Item=orden('t1', 'o-2', 'u1', 'PENDING', productos(('p1', 10))))
+    ddb.put_item(TableName=ordenes, Item=orden('t2', 'o-3', 'u2', 'PENDING', productos(('p1', 10))))
+    # La orden pierde p1 y gana p3: OrderProductos tiene que quedar solo con p2 y p3.
+    ddb.put_item(TableName=ordenes, Item=orden('t1', 'o-1', 'u1', 'PAID', productos(('p2', 5), ('p3', 7))))
+    ddb.delete_item(TableName=ordenes, Key={'tenant_id': {'S': 't1'}, 'order_id': {'S': 'o-2'}})
+    ddb.put_item(TableName=facturas, Item=factura('t1', 'f-1', 'o-1', 'PENDING', ('card', {'N': '12.5'})))
+    ddb.update_item(TableName=facturas, Key={'tenant_id': {'S': 't1'}, 'invoice_id': {'S': 'f-1'}},
+                    UpdateExpression='SET payment_details.amount = :monto, #s = :estado',
+                    ExpressionAttributeNames={'#s': 'status'},
+                    ExpressionAttributeValues={':monto': {'N': '20'}, ':estado': {'S': 'PAID'}})
+    ddb.put_item(TableName=facturas, Item=factura('t2', 'f-2', 'o-3', 'PENDING'))
+    # Un monto que no convierte a double: el registro va al dead letter y el
+    # shard sigue con f-4.
+    ddb.put_item(TableName=facturas, Item=factura('t2', 'f-3', 'o-3', 'PAID', ('cash', {'S': 'doce'})))
+    ddb.put_item(TableName=facturas, Item=factura('t2', 'f-4', 'o-3', 'PAID', ('cash', {'N': '3'})))
+    esperado = {
+        'Orders': {('t1', 'o-1', 'u1', 'PAID'), ('t2', 'o-3', 'u2', 'PENDING')},
+        'OrderProductos': {('o-1', 'p2'), ('o-1', 'p3'), ('o-3', 'p1')},
+        'Billing': {('t1', 'f-1', 'o-1', 'card', 20.0, 'PAID'), ('t2', 'f-2', 'o-3', '', 0.0, 'PENDING'),
+                    ('t2', 'f-4', 'o-3', 'cash', 3.0, 'PAID')},
+    }
+    for n in range(pedidos):
+        tenant, order_id = f't{n % 5}', f'x-{n:06d}'
+        ddb.put_item(TableName=ordenes, Item=orden(tenant, order_id, 'u9', 'PAID', productos(('p9', 1))))
+        esperado['Orders'].add((tenant, order_id, 'u9', 'PAID'))
+        esperado['OrderProductos'].add((order_id, 'p9'))
+    return esperado
+
+
+def ultimas_secuencias(ddb, streams):
+    """Último SequenceNumber de cada shard y total de registros, leyendo los streams desde el principio."""
+    ultimas = {}
+    registros = 0
+    for table_name in TABLAS:
+        stream_arn = ddb.describe_table(TableName=table_name)['Table']['LatestStreamArn']
+        shards = streams.describe_stream(StreamArn=stream_arn)['StreamDescription']['Shards']
+        for shard in shards:
+            iterador = streams.get_shard_iterator(StreamArn=stream_arn, ShardId=shard['ShardId'],
+                                                  ShardIteratorType='TRIM_HORIZON')['ShardIterator']
+            while iterador:
+                response = streams.get_records(ShardIterator=iterador)
+                if not response['Records']:
+                    break
+                registros += len(response['Records'])
+                ultimas[stream_arn, shard['ShardId']] = response['Records'][-1]['dynamodb']['SequenceNumber']
+                iterador = response.get('NextShardIterator')
+    return ultimas, registros
+
+
+def al_dia(cdc, ultimas):
+    estado = cdc.leer_checkpoint()
+    return all(estado.get(arn, {}).get(shard_id, {}).get('secuencia') == secuencia
+               for (arn, shard_id), secuencia in ultimas.items())
+
+
+def consumir_hasta(cdc, ultimas, timeout):
+    """Corre cdc_process hasta que el checkpoint alcanza ultimas y devuelve los segundos."""
+    cdc.detener.clear()
+    hilo = threading.Thread(target=cdc.cdc_process, name='cdc', daemon=True)
+    inicio = time.perf_counter()
+    hilo.start()
+    try:
+        while not al_dia(cdc, ultimas):
+            if time.perf_counter() - inicio > timeout:
+                sys.exit(f'El checkpoint no llegó al final de los streams en {timeout} s: {cdc.leer_checkpoint()}')
+            if not hilo.is_alive():
+                sys.exit('cdc_process terminó antes de aplicar los streams.')
+            time.sleep(0.1)
+        return time.perf_counter() - inicio
+    finally:
+        cdc.detener.set()
+        hilo.join()
+
+
+def comprobar_mysql(tablas_mysql, esperado):
+    connection = tablas_mysql.conectar_mysql()
+    try:
+        with connection.cursor() as cursor:
+            for table_name, sql in CONSULTAS.items():
+                cursor.execute(sql)
+                filas = {tuple(float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else v
+                               for v in fila) for fila in cursor.fetchall()}
+                if filas != esperado[table_name]:
+                    sys.exit(f'{table_name} no coincide.\n  faltan: {sorted(esperado[table_name] - filas)}\n'
+                             f'  sobran: {sorted(filas - esperado[table_name])}')
+    finally:
+        connection.close()
+
+
+def comprobar_dead_letter(cdc):
+    with open(cdc.CDC_DEAD_LETTER_PATH, encoding='utf-8') as f:
+        lineas = [json.loads(linea) for linea in f]
+    claves = [linea['registro']['dynamodb']['Keys']['invoice_id']['S'] for linea in lineas]
+    if claves != ['f-3']:
+        sys.exit(f'El dead letter debería tener solo f-3 y tiene {claves}.')
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pedidos', type=int, default=500, help='órdenes adicionales para medir')
+    parser.add_argument('--moto', action='store_true', help='levanta moto dentro de este proceso')
+    parser.add_argument('--timeout', type=float, default=120)
+    args = parser.parse_args()
+
+    servidor = None
+    if args.moto:
+        # moto solo hace falta para esta opción.
+        from moto.server import ThreadedMotoServer
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        servidor = ThreadedMotoServer(ip_address='127.0.0.1', port=0, verbose=False)
+        servidor.start()
+        endpoint = 'http://{}:{}'.format(*servidor.get_host_and_port())
+    else:
+        endpoint = os.environ.get('DYNAMODB_ENDPOINT_URL') or os.environ.get('AWS_ENDPOINT_URL')
+    if not endpoint:
+        sys.exit('Falta DYNAMODB_ENDPOINT_URL o AWS_ENDPOINT_URL (o --moto): la prueba no corre contra AWS real.')
+
+    trabajo = tempfile.mkdtemp(prefix='bench-cdc-')
+    entorno(trabajo, endpoint)
+    # cdc.py lee la configuración al importarse.
+    sys.path.insert(0, ETL_DIR)
+    import cdc
+    import tablas_mysql
+
+    try:
+        ddb = boto3.client('dynamodb', endpoint_url=endpoint)
+        streams = boto3.client('dynamodbstreams', endpoint_url=endpoint)
+        crear_tablas(ddb)
+        recrear_mysql(tablas_mysql)
+        esperado = escribir_cambios(ddb, args.pedidos)
+        ultimas, registros = ultimas_secuencias(ddb, streams)
+        segundos = consumir_hasta(cdc, ultimas, args.timeout)
+        comprobar_mysql(tablas_mysql, esperado)
+        comprobar_dead_letter(cdc)
+        print(f'CDC: {registros} registros aplicados en {segundos:.2f} s ({registros / segundos:,.0f} registros/s)')
+
+        # Un cambio más con el consumidor detenido: al volver a arrancar sigue
+        # desde el checkpoint y no repite el registro del dead letter.
+        ddb.put_item(TableName='orderService-dev', Item=orden('t2', 'o-3', 'u2', 'CANCELLED', productos(('p4', 2))))
+        esperado['Orders'].remove(('t2', 'o-3', 'u2', 'PENDING'))
+        esperado['Orders'].add(('t2', 'o-3', 'u2', 'CANCELLED'))
+        esperado['OrderProductos'].remove(('o-3', 'p1'))
+        esperado['OrderProductos'].add(('o-3', 'p4'))
+        ultimas, _ = ultimas_secuencias(ddb, streams)
+        consumir_hasta(cdc, ultimas, args.timeout)
+        comprobar_mysql(tablas_mysql, esperado)
+        comprobar_dead_letter(cdc)
+        print(f'CDC: MySQL, checkpoint y dead letter correctos; reanudación desde el checkpoint correcta ({trabajo})')
+    finally:
+        if servidor is not None:
+            servidor.stop()
+
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,359 @@
+"""Benchmark de punta a punta: datos sintéticos, ingesta, Athena local y ETL.
+
+Uso: python bench/bench_suite.py [--escala N] [--tenants N] [--formato json|parquet]
+                                 [--segmentos N] [--hasta ETAPA] [--moto] [--resultados PATH]
+
+Cada etapa corre en su propio proceso y usa lo que dejó la anterior:
+
+  siembra  crea las cinco tablas en DynamoDB y las llena con datos.py
+  ingesta  corre ingesta/ingesta.py sobre esas tablas
+  athena   ejecuta las consultas de etl/main.py en DuckDB (athena_local.py)
+  etl      corre etl_process con un cliente de Athena que devuelve esos
+           resultados y carga en MySQL
+
+DynamoDB y S3 son los de AWS_ENDPOINT_URL (el moto de docker-compose.yml) o,
+con --moto, un servidor moto dentro de este proceso. MySQL es el de MYSQL_HOST,
+MYSQL_USER, ... (por defecto el MariaDB de docker-compose.yml) y sus tablas se
+recrean con mysql.sql. La configuración de los servicios (SCAN_WORKERS,
+LOAD_METHOD, LOAD_MODE, ...) se toma del entorno.
+
+Por etapa se reporta duración, filas por segundo y pico de memoria residente
+del proceso, y por sub-etapa p50/p95/p99 según las métricas que escribe cada
+servicio. Cada corrida se agrega a --resultados con el commit actual y se
+compara con la última corrida con los mismos parámetros.
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import boto3
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(RAIZ, 'bench')
+INGESTA_DIR = os.path.join(RAIZ, 'ingesta')
+ETL_DIR = os.path.join(RAIZ, 'etl')
+sys.path.insert(0, INGESTA_DIR)
+sys.path.insert(0, BENCH_DIR)
+import datos  # noqa: E402
+from metricas import Metricas  # noqa: E402
+
+ETAPAS = ('siembra', 'ingesta', 'athena', 'etl')
+# Contador de filas de cada etapa en su JSON de métricas.
+FILAS = {'siembra': 'registros', 'ingesta': 'registros', 'athena': 'filas', 'etl': 'filas_cargadas'}
+# Variables de los servicios que cambian el resultado y forman parte de los
+# parámetros con los que se comparan corridas.
+CONFIGURACION = ('SCAN_WORKERS', 'SCAN_EXECUTOR', 'TRANSFORM_WORKERS', 'SERIALIZE_WORKERS', 'UPLOAD_WORKERS',
+                 'PIPELINE_QUEUE_SIZE', 'PIPELINE_BATCH_QUEUE_SIZE', 'BATCH_MAX_MB',
+                 'LOAD_METHOD', 'LOAD_MODE', 'LOAD_BATCH_SIZE', 'MYSQL_LOAD_WORKERS',
+                 'MYSQL_LOAD_SHARDS', 'MYSQL_POOL_SIZE', 'MYSQL_SHARD_MIN_ROWS', 'ETL_CHUNK_ROWS')
+
+
+def crear_bucket(s3, bucket):
+    try:
+        s3.create_bucket(Bucket=bucket)
+    except s3.exceptions.BucketAlreadyOwnedByYou:
+        pass
+
+
+def vaciar_bucket(s3, bucket):
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket):
+        objetos = [{'Key': objeto['Key']} for objeto in page.get('Contents', [])]
+        if objetos:
+            s3.delete_objects(Bucket=bucket, Delete={'Objects': objetos})
+
+
+def etapa_siembra(args, trabajo, metricas):
+    ddb = boto3.client('dynamodb')
+    s3 = boto3.client('s3')
+    with open(os.environ['MANIFEST_PATH'], encoding='utf-8') as f:
+        bucket = json.load(f)['bucket_name']
+    crear_bucket(s3, bucket)
+    vaciar_bucket(s3, bucket)
+
+    def escribir(table_name, lote):
+        pendientes = {table_name: lote}
+        while pendientes:
+            with metricas.medir('etapa', tabla=table_name, etapa='batch_write'):
+                pendientes = ddb.batch_write_item(RequestItems=pendientes).get('UnprocessedItems')
+        metricas.sumar('registros', len(lote), tabla=table_name)
+
+    def sembrar(table_name):
+        try:
+            ddb.delete_table(TableName=table_name)
+            ddb.get_waiter('table_not_exists').wait(TableName=table_name)
+        except ddb.exceptions.ResourceNotFoundException:
+            pass
+        ddb.create_table(
+            TableName=table_name,
+            KeySchema=[{'AttributeName': 'tenant_id', 'KeyType': 'HASH'},
+                       {'AttributeName': datos.CLAVES[table_name], 'KeyType': 'RANGE'}],
+            AttributeDefinitions=[{'AttributeName': 'tenant_id', 'AttributeType': 'S'},
+                                  {'AttributeName': datos.CLAVES[table_name], 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST',
+        )
+        ddb.get_waiter('table_exists').wait(TableName=table_name)
+        lote = []
+        for item in datos.items(table_name, args.escala, args.tenants, args.semilla):
+            lote.append({'PutRequest': {'Item': item}})
+            if len(lote) == 25:
+                escribir(table_name, lote)
+                lote = []
+        if lote:
+            escribir(table_name, lote)
+
+    with ThreadPoolExecutor(max_workers=len(datos.CLAVES)) as executor:
+        list(executor.map(sembrar, datos.CLAVES))
+
+
+def etapa_athena(args, trabajo, metricas):
+    sys.path.insert(0, ETL_DIR)
+    import main
+    from athena_local import AthenaLocal
+    from esquemas import ESQUEMAS
+
+    s3 = boto3.client('s3')
+    crear_bucket(s3, main.S3_OUTPUT_LOCATION[len('s3://'):].split('/', 1)[0])
+    with open(os.environ['MANIFEST_PATH'], encoding='utf-8') as f:
+        manifiesto = json.load(f)
+    athena = AthenaLocal(s3, os.path.join(trabajo, 'athena'))
+    for entrada in manifiesto['tables']:
+        tabla = dict(entrada, bucket_name=manifiesto['bucket_name'])
+        with metricas.medir('etapa', tabla=tabla['table_name'], etapa='descarga'):
+            athena.registrar_tabla(tabla, ESQUEMAS.get(tabla['table_name']))
+    resultados = []
+    for table_name, consulta in main.CONSULTAS.items():
+        with metricas.medir('etapa', tabla=table_name, etapa='consulta'):
+            resultado = athena.ejecutar(consulta['sql'], f'{main.S3_OUTPUT_LOCATION}bench/{table_name}.csv')
+        metricas.sumar('filas', resultado['filas'], tabla=table_name)
+        resultados.append(resultado)
+    with open(os.path.join(trabajo, 'athena_resultados.json'), 'w', encoding='utf-8') as f:
+        json.dump(resultados, f, ensure_ascii=False)
+
+
+def etapa_etl(args, trabajo):
+    sys.path.insert(0, ETL_DIR)
+    import main
+    from athena_local import ClienteAthena
+
+    with open(os.path.join(BENCH_DIR, 'mysql.sql'), encoding='utf-8') as f:
+        sentencias = [sql for sql in f.read().split(';') if sql.strip()]
+    connection = main.conectar_mysql()
+    try:
+        main.ejecutar_sql(connection, *sentencias)
+    finally:
+        connection.close()
+    with open(os.path.join(trabajo, 'athena_resultados.json'), encoding='utf-8') as f:
+        main.athena = ClienteAthena(json.load(f))
+    main.etl_process()
+
+
+def ejecutar_etapa(args):
+    # Proceso hijo: la ingesta y el ETL escriben sus propias métricas; siembra
+    # y athena las escriben acá con el mismo formato.
+    if args.etapa == 'etl':
+        etapa_etl(args, args.trabajo)
+        return
+    metricas = Metricas()
+    inicio = time.time()
+    if args.etapa == 'siembra':
+        etapa_siembra(args, args.trabajo, metricas)
+    else:
+        etapa_athena(args, args.trabajo, metricas)
+    metricas.guardar(f'bench_{args.etapa}', os.environ['METRICS_JSON_PATH'],
+                     inicio=datetime.fromtimestamp(inicio, timezone.utc).isoformat(),
+                     segundos=round(time.time() - inicio, 3))
+
+
+def entorno(args, trabajo):
+    env = dict(os.environ)
+    # Credenciales de mentira: los servicios exigen que existan y nunca deben
+    # llegar a AWS real desde el benchmark.
+    for clave in ('AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY', 'AWS_SESSION_TOKEN'):
+        env[clave] = 'bench'
+    env.setdefault('AWS_REGION', 'us-east-1')
+    env['AWS_DEFAULT_REGION'] = env['AWS_REGION']
+    env.setdefault('MYSQL_HOST', '127.0.0.1')
+    env.setdefault('MYSQL_USER', 'root')
+    env.setdefault('MYSQL_PASSWORD', 'bench')
+    env.setdefault('MYSQL_DATABASE', 'bench')
+    env.setdefault('MYSQL_PORT', '3306')
+    env['LOGS_DIR'] = os.path.join(trabajo, 'logs')
+    env['MANIFEST_PATH'] = os.path.join(trabajo, 'tablas.json')
+    # El benchmark mide la carga completa aunque los datos no hayan cambiado.
+    env['ETL_FORCE_RELOAD'] = 'true'
+    env.pop('BUCKET_NAME', None)
+    return env
+
+
+def escribir_manifiesto(args, trabajo):
+    # Las mismas tablas que en producción, con el formato y los segmentos del benchmark.
+    with open(os.path.join(INGESTA_DIR, 'tablas.json'), encoding='utf-8') as f:
+        manifiesto = json.load(f)
+    for tabla in manifiesto['tables']:
+        tabla['output_format'] = args.formato
+        tabla['scan_segments'] = args.segmentos
+    with open(os.path.join(trabajo, 'tablas.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, indent=2)
+
+
+def correr(etapa, args, env, trabajo):
+    if etapa == 'ingesta':
+        comando = [sys.executable, os.path.join(INGESTA_DIR, 'ingesta.py')]
+    else:
+        comando = [sys.executable, os.path.abspath(__file__), '--etapa', etapa, '--trabajo', trabajo,
+                   '--escala', str(args.escala), '--tenants', str(args.tenants), '--semilla', str(args.semilla)]
+    env = dict(env, METRICS_JSON_PATH=os.path.join(trabajo, f'{etapa}_metricas.json'))
+    log_path = os.path.join(trabajo, f'{etapa}.log')
+    print(f'{etapa}...', flush=True)
+    inicio = time.perf_counter()
+    with open(log_path, 'w', encoding='utf-8') as log:
+        proceso = subprocess.Popen(comando, env=env, stdout=log, stderr=subprocess.STDOUT, cwd=RAIZ)
+        # wait4 da el uso de recursos de este hijo; RUSAGE_CHILDREN daría el
+        # máximo entre todos los hijos terminados.
+        _, estado, uso = os.wait4(proceso.pid, 0)
+        proceso.returncode = os.waitstatus_to_exitcode(estado)
+    proceso_segundos = time.perf_counter() - inicio
+    if proceso.returncode:
+        with open(log_path, encoding='utf-8') as log:
+            print(''.join(log.readlines()[-30:]), file=sys.stderr)
+        sys.exit(f'La etapa {etapa} terminó con código {proceso.returncode}; log completo en {log_path}')
+
+    with open(env['METRICS_JSON_PATH'], encoding='utf-8') as f:
+        metricas = json.load(f)
+    filas = sum(c['valor'] for c in metricas['contadores'] if c['nombre'] == FILAS[etapa])
+    # Las sub-etapas se agregan sobre todas las tablas sumando sus cubetas.
+    agregadas = Metricas()
+    for t in metricas['tiempos']:
+        if t['nombre'] == 'etapa':
+            agregadas.observar('etapa', t['segundos'], t['cantidad'], t['maximo'], t['cubetas'],
+                               etapa=t['etiquetas']['etapa'])
+    return {
+        'segundos': metricas['segundos'],
+        'proceso_segundos': round(proceso_segundos, 3),
+        'filas': filas,
+        'filas_por_segundo': round(filas / metricas['segundos'], 1) if metricas['segundos'] else 0,
+        # ru_maxrss está en KB en Linux.
+        'rss_mb': round(uso.ru_maxrss / 1024, 1),
+        'subetapas': {
+            t['etiquetas']['etapa']: {clave: t[clave] for clave in ('cantidad', 'p50', 'p95', 'p99', 'maximo')}
+            for t in agregadas.exportar()['tiempos']
+        },
+    }
+
+
+def commit_actual():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, check=True,
+                                capture_output=True, text=True).stdout.strip()
+        cambios = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=RAIZ, check=True,
+                                 capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f'{commit}-sucio' if cambios else commit
+
+
+def anterior(path, parametros):
+    ultima = None
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            for linea in f:
+                corrida = json.loads(linea)
+                if corrida['parametros'] == parametros:
+                    ultima = corrida
+    return ultima
+
+
+def variacion(actual, previo):
+    return f'{(actual - previo) / previo * 100:+.1f}%' if previo else '-'
+
+
+def imprimir(corrida, previa):
+    print(f"\nCommit {corrida['commit']}, {corrida['parametros']}")
+    print(f"{'etapa':<10} {'segundos':>9} {'filas':>11} {'filas/s':>11} {'RSS MB':>8}")
+    for etapa, resultado in corrida['etapas'].items():
+        print(f"{etapa:<10} {resultado['segundos']:>9.2f} {resultado['filas']:>11,} "
+              f"{resultado['filas_por_segundo']:>11,.0f} {resultado['rss_mb']:>8.1f}")
+    print(f"\n{'sub-etapa':<28} {'n':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'máx ms':>9}")
+    for etapa, resultado in corrida['etapas'].items():
+        for subetapa, t in resultado['subetapas'].items():
+            print(f"{etapa + '/' + subetapa:<28} {t['cantidad']:>8} {t['p50'] * 1000:>9.1f} {t['p95'] * 1000:>9.1f} "
+                  f"{t['p99'] * 1000:>9.1f} {t['maximo'] * 1000:>9.1f}")
+    if not previa:
+        return
+    print(f"\nContra {previa['commit']} ({previa['fecha']}):")
+    for etapa, resultado in corrida['etapas'].items():
+        antes = previa['etapas'].get(etapa)
+        if antes:
+            print(f"{etapa:<10} filas/s {variacion(resultado['filas_por_segundo'], antes['filas_por_segundo']):>8}  "
+                  f"RSS {variacion(resultado['rss_mb'], antes['rss_mb']):>8}")
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--escala', type=int, default=10000, help='pedidos; las otras tablas se derivan de esto')
+    parser.add_argument('--tenants', type=int, default=20)
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--formato', choices=('json', 'parquet'), default='parquet')
+    parser.add_argument('--segmentos', type=int, default=4, help='scan_segments de cada tabla')
+    parser.add_argument('--hasta', choices=ETAPAS, default='etl', help='última etapa a correr')
+    parser.add_argument('--moto', action='store_true', help='levanta moto dentro de este proceso')
+    parser.add_argument('--resultados', default=os.path.join(BENCH_DIR, 'resultados.jsonl'))
+    parser.add_argument('--etapa', choices=ETAPAS, help=argparse.SUPPRESS)
+    parser.add_argument('--trabajo', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.etapa:
+        ejecutar_etapa(args)
+        return
+
+    servidor = None
+    if args.moto:
+        # moto solo hace falta para esta opción.
+        from moto.server import ThreadedMotoServer
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        servidor = ThreadedMotoServer(ip_address='127.0.0.1', port=0, verbose=False)
+        servidor.start()
+        os.environ['AWS_ENDPOINT_URL'] = 'http://{}:{}'.format(*servidor.get_host_and_port())
+    if not os.environ.get('AWS_ENDPOINT_URL'):
+        sys.exit('Falta AWS_ENDPOINT_URL (o --moto): el benchmark no corre contra AWS real.')
+
+    trabajo = tempfile.mkdtemp(prefix='bench-')
+    escribir_manifiesto(args, trabajo)
+    env = entorno(args, trabajo)
+    parametros = {
+        'escala': args.escala,
+        'tenants': args.tenants,
+        'semilla': args.semilla,
+        'formato': args.formato,
+        'segmentos': args.segmentos,
+        'configuracion': {clave: os.environ[clave] for clave in CONFIGURACION if clave in os.environ},
+    }
+    corrida = {
+        'fecha': datetime.now(timezone.utc).isoformat(),
+        'commit': commit_actual(),
+        'parametros': parametros,
+        'etapas': {},
+    }
+    try:
+        for etapa in ETAPAS[:ETAPAS.index(args.hasta) + 1]:
+            corrida['etapas'][etapa] = correr(etapa, args, env, trabajo)
+    finally:
+        if servidor:
+            servidor.stop()
+
+    previa = anterior(args.resultados, parametros)
+    imprimir(corrida, previa)
+    with open(args.resultados, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(corrida, ensure_ascii=False) + '\n')
+    print(f'\nResultados en {args.resultados}; logs y métricas en {trabajo}')
+
+
+if __name__ == '__main__':
+    main_bench()
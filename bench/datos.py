@@ -0,0 +1,129 @@
+"""Generador de datos sintéticos con la forma de las cinco tablas de DynamoDB.
+
+La escala es el número de pedidos; facturas, productos, inventario y reportes
+se derivan de ella. Para la misma escala, tenants y semilla los ítems son
+siempre los mismos, así que dos corridas del benchmark leen datos idénticos.
+Los ítems ya vienen con el formato tipado de DynamoDB ({'S': ...}, {'N': ...}).
+"""
+import random
+
+ESTADOS_PEDIDO = ('PENDING', 'PAID', 'SHIPPED', 'DELIVERED', 'CANCELLED')
+ESTADOS_FACTURA = ('PENDING', 'PAID', 'REFUNDED')
+METODOS_PAGO = ('card', 'transfer', 'cash', 'wallet')
+
+# Clave de ordenamiento de cada tabla; la de partición es siempre tenant_id.
+CLAVES = {
+    'api-reportes-dev': 'report_id',
+    'billingService-dev': 'invoice_id',
+    'inventoryService-dev': 'product_id',
+    'orderService-dev': 'order_id',
+    'productService-dev': 'product_id',
+}
+
+
+def cantidades(escala):
+    productos = max(escala // 10, 1)
+    return {
+        'api-reportes-dev': max(escala // 100, 1),
+        'billingService-dev': escala,
+        'inventoryService-dev': productos,
+        'orderService-dev': escala,
+        'productService-dev': productos,
+    }
+
+
+def fecha(rng):
+    return f'2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00'
+
+
+def numero(valor):
+    return {'N': str(valor)}
+
+
+def tenant(n, tenants):
+    return {'S': f'tenant-{n % tenants:02d}'}
+
+
+def reporte(n, rng, tenants, escala):
+    return {
+        'tenant_id': tenant(n, tenants),
+        'report_id': {'S': f'report-{n:08d}'},
+        'data': {'M': {
+            'total_sales': numero(f'{rng.uniform(100, 100000):.2f}'),
+            'total_items': numero(rng.randint(1, 5000)),
+        }},
+        'created_at': {'S': fecha(rng)},
+    }
+
+
+def factura(n, rng, tenants, escala):
+    return {
+        'invoice_id': {'S': f'invoice-{n:08d}'},
+        'tenant_id': tenant(n, tenants),
+        'order_id': {'S': f'order-{n:08d}'},
+        'status': {'S': rng.choice(ESTADOS_FACTURA)},
+        'payment_details': {'M': {
+            'method': {'S': rng.choice(METODOS_PAGO)},
+            'amount': numero(f'{rng.uniform(1, 1200):.2f}'),
+        }},
+        'created_at': {'S': fecha(rng)},
+    }
+
+
+def inventario(n, rng, tenants, escala):
+    return {
+        'product_id': {'S': f'prod-{n:06d}'},
+        'tenant_id': tenant(n, tenants),
+        'product_name': {'S': f'Producto {n}'},
+        'stock_available': numero(rng.randint(0, 500)),
+        'last_update': {'S': fecha(rng)},
+    }
+
+
+def pedido(n, rng, tenants, escala):
+    productos = cantidades(escala)['productService-dev']
+    return {
+        'order_id': {'S': f'order-{n:08d}'},
+        'tenant_id': tenant(n, tenants),
+        'user_id': {'S': f'user-{rng.randint(0, max(escala // 5, 1)):06d}'},
+        'status': {'S': rng.choice(ESTADOS_PEDIDO)},
+        'items': {'L': [
+            {'M': {
+                'product_id': {'S': f'prod-{rng.randrange(productos):06d}'},
+                'price': numero(f'{rng.uniform(1, 300):.2f}'),
+                'quantity': numero(rng.randint(1, 5)),
+            }}
+            for _ in range(rng.randint(1, 4))
+        ]},
+        'created_at': {'S': fecha(rng)},
+    }
+
+
+def producto(n, rng, tenants, escala):
+    return {
+        'product_id': {'S': f'prod-{n:06d}'},
+        'tenant_id': tenant(n, tenants),
+        'name': {'S': f'Producto {n}'},
+        'description': {'S': ' '.join(rng.choice(('liviano', 'resistente', 'importado', 'local', 'oferta'))
+                                      for _ in range(rng.randint(3, 12)))},
+        'price': numero(f'{rng.uniform(1, 300):.2f}'),
+        'created_at': {'S': fecha(rng)},
+    }
+
+
+GENERADORES = {
+    'api-reportes-dev': reporte,
+    'billingService-dev': factura,
+    'inventoryService-dev': inventario,
+    'orderService-dev': pedido,
+    'productService-dev': producto,
+}
+
+
+def items(table_name, escala, tenants, semilla=0):
+    # Cada tabla tiene su propio generador aleatorio para que el resultado no
+    # dependa del orden en que se siembran.
+    rng = random.Random(f'{semilla}-{table_name}')
+    generador = GENERADORES[table_name]
+    for n in range(cantidades(escala)[table_name]):
+        yield generador(n, rng, tenants, escala)
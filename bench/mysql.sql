@@ -0,0 +1,57 @@
+-- Tablas de destino del ETL para el benchmark, con las columnas y las claves
+-- de TABLAS_MYSQL (etl/tablas_mysql.py).
+DROP TABLE IF EXISTS OrderProductos;
+DROP TABLE IF EXISTS Orders;
+DROP TABLE IF EXISTS Reports;
+DROP TABLE IF EXISTS Billing;
+DROP TABLE IF EXISTS Inventory;
+DROP TABLE IF EXISTS Productos;
+
+CREATE TABLE Reports (
+    tenant_id VARCHAR(64) NOT NULL,
+    report_id VARCHAR(64) NOT NULL,
+    total_sales DOUBLE,
+    total_items BIGINT,
+    PRIMARY KEY (tenant_id, report_id)
+);
+
+CREATE TABLE Billing (
+    invoice_id VARCHAR(64) NOT NULL,
+    tenant_id VARCHAR(64) NOT NULL,
+    order_id VARCHAR(64),
+    method VARCHAR(32),
+    amount DOUBLE,
+    status VARCHAR(32),
+    PRIMARY KEY (tenant_id, invoice_id)
+);
+
+CREATE TABLE Inventory (
+    product_id VARCHAR(64) NOT NULL,
+    tenant_id VARCHAR(64) NOT NULL,
+    stock_available DOUBLE,
+    last_update VARCHAR(64),
+    PRIMARY KEY (tenant_id, product_id)
+);
+
+CREATE TABLE Orders (
+    order_id VARCHAR(64) NOT NULL,
+    tenant_id VARCHAR(64) NOT NULL,
+    user_id VARCHAR(64),
+    status VARCHAR(32),
+    PRIMARY KEY (tenant_id, order_id)
+);
+
+CREATE TABLE OrderProductos (
+    order_id VARCHAR(64) NOT NULL,
+    product_id VARCHAR(64) NOT NULL,
+    PRIMARY KEY (order_id, product_id)
+);
+
+CREATE TABLE Productos (
+    product_id VARCHAR(64) NOT NULL,
+    tenant_id VARCHAR(64) NOT NULL,
+    name VARCHAR(255),
+    price DOUBLE,
+    description TEXT,
+    PRIMARY KEY (tenant_id, product_id)
+);
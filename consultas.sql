@@ -42,6 +42,17 @@ FROM "AwsDataCatalog"."catalogo"."inventoryservice-dev"
 WHERE stock_available < 50
 ORDER BY stock_available ASC;
 /*
+Productos con bajo inventario de un tenant: con partition projection solo se
+leen las particiones tenant_id=.../dt=... que cumplen el filtro.
+*/
+SELECT
+    product_name,
+    stock_available,
+    last_update
+FROM "AwsDataCatalog"."catalogo"."low_inventory_products"
+WHERE tenant_id = 'tenant-1'
+ORDER BY stock_available ASC;
+/*
 Detalles de pagos por estado
 */
 SELECT
@@ -0,0 +1,100 @@
+"""Benchmark de carga en MySQL: fila por fila vs executemany vs LOAD DATA LOCAL INFILE.
+
+Uso: python bench_carga.py [--filas N] [--batch-size N]
+
+Necesita un MySQL/MariaDB local con local_infile habilitado, por ejemplo:
+
+    docker run -d --name mariadb-bench -p 3306:3306 -e MARIADB_ROOT_PASSWORD=bench \\
+        -e MARIADB_DATABASE=bench mariadb:11 --local-infile=1
+
+y las variables MYSQL_HOST, MYSQL_USER, MYSQL_PASSWORD, MYSQL_DATABASE y
+MYSQL_PORT apuntando a él. Crea y borra la tabla bench_orders.
+"""
+import argparse
+import os
+import time
+
+import pandas as pd
+
+os.environ.setdefault("AWS_REGION", "us-east-1")
+import main  # noqa: E402
+
+TABLA = "bench_orders"
+
+
+def filas_sinteticas(n):
+    return pd.DataFrame({
+        "order_id": [f"order-{i:08d}" for i in range(n)],
+        "tenant_id": [f"tenant-{i % 20}" for i in range(n)],
+        "user_id": [f"user-{i % 5000}" for i in range(n)],
+        "status": [("PENDING", "PAID", "SHIPPED")[i % 3] for i in range(n)],
+    })
+
+
+def fila_por_fila(data, table_name):
+    # El camino anterior: un execute por registro y un commit al final.
+    connection = main.conectar_mysql()
+    try:
+        with connection.cursor() as cursor:
+            for record in data.to_dict("records"):
+                columns = ", ".join(record.keys())
+                placeholders = ", ".join(["%s"] * len(record))
+                cursor.execute(f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})", tuple(record.values()))
+        connection.commit()
+    finally:
+        connection.close()
+    return len(data), 0
+
+
+def ejecutar_sql(sql):
+    connection = main.conectar_mysql()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def medir(nombre, data, cargar):
+    ejecutar_sql(f"TRUNCATE TABLE {TABLA}")
+    inicio = time.perf_counter()
+    cargadas, fallidas = cargar(data, TABLA)
+    segundos = time.perf_counter() - inicio
+    # Una carga con lotes fallidos terminaría antes y daría un número engañoso.
+    assert fallidas == 0 and cargadas == len(data), f"{nombre}: {cargadas} cargadas, {fallidas} fallidas"
+    print(f"{nombre:<16} {segundos:8.2f} s  {len(data) / segundos:12,.0f} filas/s")
+    return segundos
+
+
+def usar_metodo(metodo):
+    # local_infile se fija al abrir la conexión: se cierran las del pool para
+    # que la siguiente medición no reciba conexiones del método anterior.
+    main.pool.cerrar()
+    main.LOAD_METHOD = metodo
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filas", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=main.LOAD_BATCH_SIZE)
+    args = parser.parse_args()
+
+    main.LOAD_METHOD = "load_data"
+    ejecutar_sql(f"DROP TABLE IF EXISTS {TABLA}")
+    ejecutar_sql(f"CREATE TABLE {TABLA} (order_id VARCHAR(64) PRIMARY KEY, tenant_id VARCHAR(64), "
+                 f"user_id VARCHAR(64), status VARCHAR(32))")
+    data = filas_sinteticas(args.filas)
+    try:
+        base = medir("fila por fila", data, fila_por_fila)
+        usar_metodo("executemany")
+        lotes = medir("executemany", data, lambda d, t: main.load_to_mysql(d, t, args.batch_size))
+        usar_metodo("load_data")
+        infile = medir("load_data", data, lambda d, t: main.load_to_mysql(d, t, args.batch_size))
+        print(f"Aceleración: {base / lotes:.1f}x executemany, {base / infile:.1f}x load_data")
+    finally:
+        ejecutar_sql(f"DROP TABLE IF EXISTS {TABLA}")
+
+
+if __name__ == "__main__":
+    main_bench()
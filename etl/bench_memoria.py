@@ -0,0 +1,80 @@
+"""Benchmark de memoria del ETL: resultado completo en memoria vs chunks de ETL_CHUNK_ROWS.
+
+Uso: python bench_memoria.py [--filas N [N ...]] [--chunk-rows N]
+
+Genera un CSV sintético (billing-{filas}.csv) con la forma del resultado de la
+consulta de Billing y lo pasa por leer_resultados y a_filas, descartando lo que
+iría a MySQL. Cada caso corre en un proceso aparte y se reporta el pico de
+memoria residente por encima de la línea base del proceso.
+Con chunks, el pico debe mantenerse plano aunque crezca el número de filas.
+No necesita AWS ni MySQL.
+"""
+import argparse
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("AWS_REGION", "us-east-1")
+import main  # noqa: E402
+
+COLUMN_INFO = [
+    {"Name": "invoice_id", "Type": "varchar"},
+    {"Name": "tenant_id", "Type": "varchar"},
+    {"Name": "order_id", "Type": "varchar"},
+    {"Name": "method", "Type": "varchar"},
+    {"Name": "amount", "Type": "double"},
+    {"Name": "status", "Type": "varchar"},
+]
+
+
+def escribir_csv(path, filas):
+    random.seed(0)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(",".join(f'"{col["Name"]}"' for col in COLUMN_INFO) + "\n")
+        for n in range(filas):
+            f.write(f'"invoice-{n:08d}","tenant-{n % 20}","order-{n:08d}","card",'
+                    f'"{random.uniform(1, 1000):.2f}","PAID"\n')
+
+
+def medir(path, chunk_rows):
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    inicio = time.perf_counter()
+    filas = 0
+    with open(path, "rb") as body:
+        for results in main.leer_resultados(body, COLUMN_INFO, chunk_rows):
+            filas += len(main.a_filas(results))
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base
+    print(f"{filas} {pico} {time.perf_counter() - inicio:.2f}")
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filas", type=int, nargs="+", default=[50000, 200000, 800000])
+    parser.add_argument("--chunk-rows", type=int, default=main.ETL_CHUNK_ROWS)
+    parser.add_argument("--medir", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        medir(args.medir[0], int(args.medir[1]))
+        return
+
+    print(f"{'filas':>10} {'modo':<18} {'pico MB':>10} {'segundos':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for filas in args.filas:
+            path = os.path.join(tmp, f"billing-{filas}.csv")
+            escribir_csv(path, filas)
+            for modo, chunk_rows in (("completo", filas), (f"chunks de {args.chunk_rows}", args.chunk_rows)):
+                salida = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--medir", path, str(chunk_rows)],
+                    check=True, capture_output=True, text=True,
+                ).stdout.split()
+                # ru_maxrss está en KB en Linux.
+                print(f"{filas:>10} {modo:<18} {int(salida[1]) / 1024:>10.1f} {float(salida[2]):>10.2f}")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,149 @@
+"""Benchmark y fuzz del lector de resultados de Athena (leer_resultados).
+
+Uso: python bench_parser.py [--filas N] [--fuzz N]
+
+El benchmark mide cuántas filas por segundo convierte leer_resultados desde el
+CSV de Athena a DataFrames tipados. El fuzz escribe resultados aleatorios en el
+formato de Athena (todo entre comillas, NULL como campo vacío) con textos que
+contienen comas, comillas, saltos de línea, espacios, caracteres no ASCII y
+palabras como NA o null, los lee con tamaños de chunk al azar y comprueba que
+cada valor vuelve igual. El único valor que el formato no distingue es el
+texto vacío, que se lee como NULL salvo en las columnas con defecto (las del
+COALESCE de tablas_mysql.py), donde vuelve el defecto. No necesita AWS ni MySQL.
+"""
+import argparse
+import io
+import os
+import random
+import string
+import time
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+os.environ.setdefault("AWS_REGION", "us-east-1")
+import main  # noqa: E402
+
+CARACTERES = string.ascii_letters + string.digits + ' ,;{}[]=\'"\n\r\t-_.:ñé€'
+# Textos que el lector de CSV de pandas convierte en nulo si no se le indica otra cosa.
+PALABRAS_NULAS = ("NA", "N/A", "null", "NULL", "None", "nan", "NaN", "#N/A", "-nan", "n/a", "<NA>")
+INICIO_FECHAS = datetime(2020, 1, 1)
+
+
+def texto(rng):
+    if rng.random() < 0.2:
+        return rng.choice(PALABRAS_NULAS)
+    return "".join(rng.choice(CARACTERES) for _ in range(rng.randint(0, 16)))
+
+
+def marca_de_tiempo(rng):
+    return INICIO_FECHAS + timedelta(milliseconds=rng.randrange(10 ** 11))
+
+
+# Tipo de Athena -> (generador del valor, texto con que Athena lo escribe en el CSV).
+GENERADORES = {
+    "varchar": (texto, str),
+    "integer": (lambda rng: rng.randint(-2 ** 31, 2 ** 31 - 1), str),
+    "bigint": (lambda rng: rng.randint(-2 ** 63, 2 ** 63 - 1), str),
+    "double": (lambda rng: rng.choice((rng.uniform(-1e6, 1e6), rng.uniform(-1, 1) * 10 ** rng.randint(-300, 300))),
+               repr),
+    "boolean": (lambda rng: rng.random() < 0.5, lambda valor: str(valor).lower()),
+    "date": (lambda rng: marca_de_tiempo(rng).date(), lambda valor: valor.isoformat()),
+    "timestamp": (marca_de_tiempo, lambda valor: valor.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]),
+}
+
+
+def valor_csv(valor, escribir):
+    # Igual que Athena: NULL como campo vacío y todo lo demás entre comillas.
+    if valor is None:
+        return ""
+    return '"' + escribir(valor).replace('"', '""') + '"'
+
+
+def resultado_aleatorio(rng, filas):
+    column_info = [{"Name": f"c{n}", "Type": rng.choice(list(GENERADORES))} for n in range(rng.randint(1, 8))]
+    columnas = {}
+    for col in column_info:
+        generar, _ = GENERADORES[col["Type"]]
+        columnas[col["Name"]] = [None if rng.random() < 0.15 else generar(rng) for _ in range(filas)]
+    lineas = [",".join(valor_csv(col["Name"], str) for col in column_info)]
+    for n in range(filas):
+        lineas.append(",".join(valor_csv(columnas[col["Name"]][n], GENERADORES[col["Type"]][1])
+                               for col in column_info))
+    return column_info, columnas, ("\n".join(lineas) + "\n").encode("utf-8")
+
+
+def leido(valor, tipo):
+    if valor is None or valor is pd.NaT or (not isinstance(valor, str) and pd.isna(valor)):
+        return None
+    if tipo == "date":
+        return valor.date() if isinstance(valor, datetime) else date.fromisoformat(str(valor)[:10])
+    if tipo == "timestamp":
+        return valor.to_pydatetime() if isinstance(valor, pd.Timestamp) else valor
+    if tipo in ("integer", "bigint"):
+        return int(valor)
+    if tipo == "boolean":
+        return bool(valor)
+    return valor
+
+
+def esperado(valor, tipo, defectos, nombre):
+    # Una columna con defecto viene de un COALESCE: Athena no escribe NULL y el
+    # texto vacío se recupera con el defecto.
+    if nombre in defectos and valor in (None, ""):
+        return defectos[nombre]
+    if tipo == "varchar" and valor == "":
+        return None
+    return valor
+
+
+def fuzz(n):
+    rng = random.Random(1)
+    valores = 0
+    for caso in range(n):
+        filas = rng.randint(0, 60)
+        column_info, columnas, body = resultado_aleatorio(rng, filas)
+        chunk_rows = rng.randint(1, max(filas, 1))
+        defectos = {col["Name"]: "" for col in column_info if col["Type"] == "varchar" and rng.random() < 0.5}
+        chunks = list(main.leer_resultados(io.BytesIO(body), column_info, chunk_rows, defectos))
+        assert all(len(chunk) <= chunk_rows for chunk in chunks), (caso, chunk_rows)
+        data = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=list(columnas))
+        assert list(data.columns) == list(columnas) and len(data) == filas, (caso, data.columns, len(data))
+        for col in column_info:
+            nombre, tipo = col["Name"], col["Type"]
+            for fila, (original, valor) in enumerate(zip(columnas[nombre], data[nombre].tolist())):
+                obtenido = leido(valor, tipo)
+                assert obtenido == esperado(original, tipo, defectos, nombre), \
+                    f"caso {caso}, columna {nombre} ({tipo}), fila {fila}: {original!r} se leyó como {obtenido!r}"
+                valores += 1
+    print(f"fuzz: {n} resultados, {valores} valores leídos sin diferencias")
+
+
+def medir(filas):
+    rng = random.Random(0)
+    column_info = [{"Name": "tenant_id", "Type": "varchar"}, {"Name": "order_id", "Type": "varchar"},
+                   {"Name": "status", "Type": "varchar"}, {"Name": "amount", "Type": "double"},
+                   {"Name": "total_items", "Type": "bigint"}, {"Name": "created_at", "Type": "timestamp"}]
+    lineas = [",".join(valor_csv(col["Name"], str) for col in column_info)]
+    for n in range(filas):
+        lineas.append(f'"tenant-{n % 20}","order-{n:08d}","PAID","{rng.uniform(1, 1000):.2f}",'
+                      f'"{rng.randint(1, 50)}","{marca_de_tiempo(rng).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]}"')
+    body = ("\n".join(lineas) + "\n").encode("utf-8")
+    inicio = time.perf_counter()
+    leidas = sum(len(chunk) for chunk in main.leer_resultados(io.BytesIO(body), column_info))
+    segundos = time.perf_counter() - inicio
+    print(f"leer_resultados: {leidas} filas en {segundos:.2f} s ({leidas / segundos:,.0f} filas/s, "
+          f"{len(body) / segundos / 1024 / 1024:.1f} MB/s)")
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filas", type=int, default=500000)
+    parser.add_argument("--fuzz", type=int, default=2000)
+    args = parser.parse_args()
+    medir(args.filas)
+    fuzz(args.fuzz)
+
+
+if __name__ == "__main__":
+    main_bench()
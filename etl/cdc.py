@@ -0,0 +1,422 @@
+"""Consumidor CDC: aplica los DynamoDB Streams de las tablas directamente en MySQL.
+
+Es un proceso de larga duración que complementa a main.py: la carga completa
+por Athena deja MySQL al día y este proceso lo mantiene así aplicando cada
+INSERT/MODIFY como upsert y cada REMOVE como DELETE, sin pasar por S3.
+
+Cada shard abierto se lee en su propio hilo y con su propia conexión a MySQL;
+un shard hijo no empieza hasta que su padre está cerrado, así que los cambios
+de una misma clave se aplican en orden. Cada respuesta de get_records se aplica
+en una sola transacción y recién después se guarda el SequenceNumber del último
+registro en CDC_CHECKPOINT_PATH: si el proceso se corta, se repite a lo sumo el
+último lote, y como upserts y deletes son idempotentes el resultado es el mismo.
+Los registros que no se pueden aplicar por un error que no es transitorio se
+guardan en CDC_DEAD_LETTER_PATH y el shard sigue (ver aplicar_con_reintentos).
+
+Los streams deben tener StreamViewType NEW_IMAGE o NEW_AND_OLD_IMAGES. Con
+DYNAMODB_ENDPOINT_URL apunta a DynamoDB Local (ver docker-compose.yml);
+bench/bench_cdc.py lo prueba de punta a punta contra DynamoDB Local o moto y
+MySQL.
+"""
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import boto3
+import pymysql
+from boto3.dynamodb.types import TypeDeserializer
+from loguru import logger
+
+from metricas import Metricas
+from tablas_mysql import TABLAS_MYSQL, conectar_mysql, filas_de, tablas_de_fuente
+
+LOGS_DIR = os.getenv("LOGS_DIR", "/logs_output")
+AWS_REGION = os.getenv("AWS_REGION")
+AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
+AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
+AWS_SESSION_TOKEN = os.getenv("AWS_SESSION_TOKEN")
+DYNAMODB_ENDPOINT_URL = os.getenv("DYNAMODB_ENDPOINT_URL")
+CDC_TABLES = [t for t in os.getenv("CDC_TABLES", "").split(",") if t]
+CDC_CHECKPOINT_PATH = os.getenv("CDC_CHECKPOINT_PATH", f"{LOGS_DIR}/cdc_checkpoint.json")
+CDC_START_POSITION = os.getenv("CDC_START_POSITION", "TRIM_HORIZON")
+CDC_BATCH_SIZE = int(os.getenv("CDC_BATCH_SIZE", 1000))
+CDC_POLL_SECONDS = float(os.getenv("CDC_POLL_SECONDS", 1))
+CDC_DISCOVERY_SECONDS = float(os.getenv("CDC_DISCOVERY_SECONDS", 30))
+CDC_RETRY_MAX_SECONDS = float(os.getenv("CDC_RETRY_MAX_SECONDS", 60))
+CDC_MAX_INTENTOS = int(os.getenv("CDC_MAX_INTENTOS", 8))
+CDC_DEAD_LETTER_PATH = os.getenv("CDC_DEAD_LETTER_PATH", f"{LOGS_DIR}/cdc_dead_letter.jsonl")
+CDC_METRICS_JSON_PATH = os.getenv("CDC_METRICS_JSON_PATH", f"{LOGS_DIR}/cdc_metricas.json")
+CDC_METRICS_PROM_PATH = os.getenv("CDC_METRICS_PROM_PATH")
+METRICS_PUSHGATEWAY_URL = os.getenv("METRICS_PUSHGATEWAY_URL")
+
+logger.add(f"{LOGS_DIR}/cdc_log.log", filter=lambda record: record["extra"].get("cdc"))
+id = "CDC"
+
+def critical(message):
+    logger.bind(cdc=True).critical(f"{id} - {message}")
+def info(message):
+    logger.bind(cdc=True).info(f"{id} - {message}")
+def error(message):
+    logger.bind(cdc=True).error(f"{id} - {message}")
+def warning(message):
+    logger.bind(cdc=True).warning(f"{id} - {message}")
+def exit_program(early_exit=False):
+    if early_exit:
+        warning("Saliendo del programa antes de la ejecución debido a un error previo.")
+        sys.exit(1)
+    else:
+        info("Programa terminado exitosamente.")
+
+# Tablas de MySQL que alimenta cada tabla de DynamoDB, en el orden de las
+# claves foráneas de TABLAS_MYSQL.
+MAPEOS = {tabla["fuente"]: tablas_de_fuente(tabla["fuente"]) for tabla in TABLAS_MYSQL.values()}
+
+if CDC_MAX_INTENTOS < 1:
+    critical("CDC_MAX_INTENTOS debe ser mayor o igual a 1.")
+    exit_program(True)
+if CDC_START_POSITION not in ("TRIM_HORIZON", "LATEST"):
+    critical(f"CDC_START_POSITION inválido: {CDC_START_POSITION}. Valores permitidos: TRIM_HORIZON, LATEST.")
+    exit_program(True)
+desconocidas = set(CDC_TABLES) - set(MAPEOS)
+if desconocidas:
+    critical(f"Tablas sin mapeo a MySQL en CDC_TABLES: {sorted(desconocidas)}")
+    exit_program(True)
+
+def cliente(servicio):
+    return boto3.client(
+        servicio,
+        region_name=AWS_REGION,
+        aws_access_key_id=AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+        aws_session_token=AWS_SESSION_TOKEN,
+        endpoint_url=DYNAMODB_ENDPOINT_URL,
+    )
+
+dynamodb = cliente("dynamodb")
+streams = cliente("dynamodbstreams")
+deserializer = TypeDeserializer()
+detener = threading.Event()
+METRICAS = Metricas()
+
+# Estado por stream: {stream_arn: {shard_id: {"secuencia": ..., "cerrado": bool}}}.
+checkpoint_lock = threading.Lock()
+dead_letter_lock = threading.Lock()
+
+# Códigos de MySQL de errores que se resuelven solos: deadlock, espera de lock
+# y clave foránea cuyo padre todavía no llegó desde otro stream.
+ERRORES_TRANSITORIOS = {1205, 1213, 1216, 1452}
+# Códigos del cliente de conexión perdida o rechazada.
+ERRORES_CONEXION = {1040, 2003, 2006, 2013, 2055}
+
+def error_de_conexion(e):
+    if isinstance(e, (pymysql.err.InterfaceError, ConnectionError)):
+        return True
+    return isinstance(e, pymysql.err.OperationalError) and bool(e.args) and e.args[0] in ERRORES_CONEXION
+
+def error_transitorio(e):
+    return isinstance(e, pymysql.err.MySQLError) and bool(e.args) and e.args[0] in ERRORES_TRANSITORIOS
+
+def leer_checkpoint():
+    try:
+        with open(CDC_CHECKPOINT_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def guardar_checkpoint(estado):
+    os.makedirs(os.path.dirname(CDC_CHECKPOINT_PATH) or ".", exist_ok=True)
+    tmp_file = f"{CDC_CHECKPOINT_PATH}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(estado, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, CDC_CHECKPOINT_PATH)
+
+def actualizar_shard(estado, stream_arn, shard_id, **cambios):
+    with checkpoint_lock:
+        estado.setdefault(stream_arn, {}).setdefault(shard_id, {}).update(cambios)
+        guardar_checkpoint(estado)
+
+def python(imagen):
+    return {k: deserializer.deserialize(v) for k, v in (imagen or {}).items()}
+
+def cambios_del_lote(registros):
+    """Reduce los registros a la última operación por clave de DynamoDB.
+
+    Dentro de un shard los registros de una clave llegan en orden, así que solo
+    importa el último; las claves distintas no dependen entre sí.
+    """
+    cambios = {}
+    for registro in registros:
+        claves = python(registro["dynamodb"]["Keys"])
+        cambios[tuple(sorted(claves.items()))] = (
+            registro["eventName"], claves, python(registro["dynamodb"].get("NewImage")))
+    return list(cambios.values())
+
+def valor_mysql(valor):
+    return float(valor) if isinstance(valor, Decimal) else valor
+
+def aplicar_cambios(connection, tablas, cambios):
+    """Aplica los cambios de un lote en una transacción y devuelve las filas escritas por tabla."""
+    escritas = {}
+    with connection.cursor() as cursor:
+        for table_name in reversed(tablas):
+            tabla = TABLAS_MYSQL[table_name]
+            borrar = [tuple(valor_mysql(claves[c]) for c in tabla["clave"])
+                      for evento, claves, _ in cambios if evento == "REMOVE" or tabla.get("reemplazar")]
+            if borrar:
+                condicion = " AND ".join(f"{c} = %s" for c in tabla["clave"])
+                cursor.executemany(f"DELETE FROM {table_name} WHERE {condicion}", borrar)
+        for table_name in tablas:
+            filas = [fila for evento, _, item in cambios if evento != "REMOVE" for fila in filas_de(table_name, item)]
+            if not filas:
+                continue
+            columnas = list(filas[0])
+            lista = ", ".join(columnas)
+            placeholders = ", ".join(["%s"] * len(columnas))
+            actualizaciones = ", ".join(f"{c} = VALUES({c})" for c in columnas)
+            cursor.executemany(
+                f"INSERT INTO {table_name} ({lista}) VALUES ({placeholders}) "
+                f"ON DUPLICATE KEY UPDATE {actualizaciones}",
+                [tuple(valor_mysql(fila[c]) for c in columnas) for fila in filas],
+            )
+            escritas[table_name] = len(filas)
+    connection.commit()
+    return escritas
+
+def aplicar_lote(connection, table_name, registros):
+    connection.ping(reconnect=True)
+    with METRICAS.medir("etapa", tabla=table_name, etapa="mysql"):
+        escritas = aplicar_cambios(connection, MAPEOS[table_name], cambios_del_lote(registros))
+    for tabla, filas in escritas.items():
+        METRICAS.sumar("filas_aplicadas", filas, tabla=tabla)
+
+def deshacer(connection):
+    try:
+        connection.rollback()
+    except Exception:
+        pass
+
+def guardar_dead_letter(table_name, shard_id, registro, e):
+    linea = {
+        "fecha": datetime.now(timezone.utc).isoformat(),
+        "tabla": table_name,
+        "shard": shard_id,
+        "error": f"{type(e).__name__}: {e}",
+        "registro": registro,
+    }
+    with dead_letter_lock:
+        os.makedirs(os.path.dirname(CDC_DEAD_LETTER_PATH) or ".", exist_ok=True)
+        with open(CDC_DEAD_LETTER_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(linea, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+    METRICAS.sumar("dead_letter", tabla=table_name)
+    error(f"Registro {registro['dynamodb']['SequenceNumber']} del shard {shard_id} de {table_name} enviado a "
+          f"{CDC_DEAD_LETTER_PATH}: {e}")
+
+def aplicar_de_a_uno(connection, table_name, shard_id, registros):
+    # Se aplica cada registro en su propia transacción, en orden, para aislar
+    # los que fallan sin perder el resto del lote.
+    for registro in registros:
+        try:
+            aplicar_lote(connection, table_name, [registro])
+        except Exception as e:
+            deshacer(connection)
+            if error_de_conexion(e):
+                error(f"Se perdió la conexión a MySQL en el shard {shard_id} de {table_name}: {e}")
+                return False
+            guardar_dead_letter(table_name, shard_id, registro, e)
+    return True
+
+def aplicar_con_reintentos(connection, table_name, shard_id, registros):
+    """Aplica un lote y devuelve True si se puede avanzar el checkpoint.
+
+    Los errores de conexión y los transitorios (deadlock, espera de lock,
+    clave foránea cuyo padre todavía no llegó) se reintentan con backoff hasta
+    CDC_MAX_INTENTOS. Si la conexión sigue caída, devuelve False sin avanzar y
+    el shard se vuelve a abrir en el siguiente descubrimiento. Cualquier otro
+    error (un atributo de clave que falta, un valor que no convierte, una
+    restricción que no se cumple) no se arregla reintentando: el lote se aplica
+    registro por registro y los que fallan van a CDC_DEAD_LETTER_PATH, para que
+    un registro envenenado no detenga el shard hasta que el stream lo descarte.
+    """
+    espera = 1
+    for intento in range(1, CDC_MAX_INTENTOS + 1):
+        try:
+            aplicar_lote(connection, table_name, registros)
+            return True
+        except Exception as e:
+            deshacer(connection)
+            reintentable = error_de_conexion(e) or error_transitorio(e)
+            error(f"Error aplicando {len(registros)} registros del shard {shard_id} de {table_name} "
+                  f"(intento {intento}/{CDC_MAX_INTENTOS}): {e}")
+            if not reintentable:
+                break
+            if intento == CDC_MAX_INTENTOS:
+                if error_de_conexion(e):
+                    return False
+                break
+            METRICAS.sumar("reintentos", tabla=table_name)
+            detener.wait(espera)
+            espera = min(espera * 2, CDC_RETRY_MAX_SECONDS)
+            if detener.is_set():
+                return False
+    return aplicar_de_a_uno(connection, table_name, shard_id, registros)
+
+def conectar_con_reintentos(table_name, shard_id):
+    # Igual que un lote que falla: sin MySQL el shard espera con backoff en
+    # lugar de morir, y se reporta cada intento.
+    espera = 1
+    intento = 1
+    while not detener.is_set():
+        try:
+            return conectar_mysql()
+        except Exception as e:
+            error(f"Error conectando a MySQL para el shard {shard_id} de {table_name} (intento {intento}): {e}")
+            METRICAS.sumar("reintentos", tabla=table_name)
+            detener.wait(espera)
+            espera = min(espera * 2, CDC_RETRY_MAX_SECONDS)
+            intento += 1
+    return None
+
+def obtener_iterador(stream_arn, shard_id, secuencia):
+    parametros = {"StreamArn": stream_arn, "ShardId": shard_id}
+    if secuencia:
+        try:
+            return streams.get_shard_iterator(ShardIteratorType="AFTER_SEQUENCE_NUMBER", SequenceNumber=secuencia,
+                                              **parametros)["ShardIterator"]
+        except streams.exceptions.TrimmedDataAccessException:
+            warning(f"El checkpoint del shard {shard_id} ya salió de la retención del stream; se perdieron "
+                    f"cambios y hace falta una carga completa con main.py. Se continúa desde TRIM_HORIZON.")
+            tipo = "TRIM_HORIZON"
+    else:
+        tipo = CDC_START_POSITION
+    return streams.get_shard_iterator(ShardIteratorType=tipo, **parametros)["ShardIterator"]
+
+def consumir_shard(table_name, stream_arn, shard_id, estado):
+    secuencia = estado.get(stream_arn, {}).get(shard_id, {}).get("secuencia")
+    info(f"Leyendo el shard {shard_id} de {table_name} desde {secuencia or CDC_START_POSITION}.")
+    connection = None
+    try:
+        connection = conectar_con_reintentos(table_name, shard_id)
+        if connection is None:
+            return
+        iterador = obtener_iterador(stream_arn, shard_id, secuencia)
+        while iterador and not detener.is_set():
+            try:
+                with METRICAS.medir("etapa", tabla=table_name, etapa="get_records"):
+                    response = streams.get_records(ShardIterator=iterador, Limit=CDC_BATCH_SIZE)
+            except streams.exceptions.ExpiredIteratorException:
+                iterador = obtener_iterador(stream_arn, shard_id, secuencia)
+                continue
+            registros = response["Records"]
+            if registros:
+                if not aplicar_con_reintentos(connection, table_name, shard_id, registros):
+                    if not detener.is_set():
+                        warning(f"El shard {shard_id} de {table_name} se detiene sin avanzar el checkpoint; se "
+                                f"vuelve a abrir en el próximo descubrimiento de shards.")
+                    return
+                secuencia = registros[-1]["dynamodb"]["SequenceNumber"]
+                actualizar_shard(estado, stream_arn, shard_id, secuencia=secuencia, cerrado=False)
+                METRICAS.sumar("registros", len(registros), tabla=table_name)
+                creado = registros[-1]["dynamodb"].get("ApproximateCreationDateTime")
+                if creado is not None:
+                    retraso = datetime.now(timezone.utc).timestamp() - creado.timestamp()
+                    METRICAS.fijar("retraso_segundos", round(max(retraso, 0), 3), tabla=table_name)
+            iterador = response.get("NextShardIterator")
+            if iterador and not registros:
+                detener.wait(CDC_POLL_SECONDS)
+        if iterador is None:
+            # Sin NextShardIterator el shard está cerrado y ya se leyó completo;
+            # sus hijos pueden empezar.
+            actualizar_shard(estado, stream_arn, shard_id, secuencia=secuencia, cerrado=True)
+            info(f"Shard {shard_id} de {table_name} cerrado y aplicado por completo.")
+    except Exception as e:
+        error(f"Error leyendo el shard {shard_id} de {table_name}: {e}")
+    finally:
+        if connection is not None:
+            connection.close()
+
+def stream_de_tabla(table_name):
+    tabla = dynamodb.describe_table(TableName=table_name)["Table"]
+    especificacion = tabla.get("StreamSpecification", {})
+    if not especificacion.get("StreamEnabled") or not tabla.get("LatestStreamArn"):
+        critical(f"La tabla {table_name} no tiene DynamoDB Streams habilitado.")
+        return None
+    if especificacion.get("StreamViewType") not in ("NEW_IMAGE", "NEW_AND_OLD_IMAGES"):
+        critical(f"El stream de {table_name} es {especificacion.get('StreamViewType')}; "
+                 f"se necesita NEW_IMAGE o NEW_AND_OLD_IMAGES.")
+        return None
+    return tabla["LatestStreamArn"]
+
+def listar_shards(stream_arn):
+    shards = []
+    parametros = {"StreamArn": stream_arn}
+    while True:
+        descripcion = streams.describe_stream(**parametros)["StreamDescription"]
+        shards.extend(descripcion["Shards"])
+        if not descripcion.get("LastEvaluatedShardId"):
+            return shards
+        parametros["ExclusiveStartShardId"] = descripcion["LastEvaluatedShardId"]
+
+def guardar_metricas(inicio):
+    METRICAS.fijar("inicio_timestamp_seconds", int(inicio))
+    try:
+        METRICAS.guardar("cdc", CDC_METRICS_JSON_PATH, CDC_METRICS_PROM_PATH, METRICS_PUSHGATEWAY_URL,
+                         inicio=datetime.fromtimestamp(inicio, timezone.utc).isoformat(),
+                         segundos=round(time.time() - inicio, 3))
+    except Exception as e:
+        warning(f"No fue posible guardar las métricas: {e}")
+
+def cdc_process():
+    inicio = time.time()
+    tablas = CDC_TABLES or list(MAPEOS)
+    arns = {table_name: stream_de_tabla(table_name) for table_name in tablas}
+    if not all(arns.values()):
+        exit_program(True)
+    estado = leer_checkpoint()
+    hilos = {}
+    info(f"Consumiendo los streams de {len(arns)} tablas.")
+    while not detener.is_set():
+        for table_name, stream_arn in arns.items():
+            try:
+                shards = listar_shards(stream_arn)
+            except Exception as e:
+                error(f"Error listando los shards de {table_name}: {e}")
+                continue
+            vigentes = {shard["ShardId"] for shard in shards}
+            with checkpoint_lock:
+                cerrados = {s for s, e in estado.get(stream_arn, {}).items() if e.get("cerrado")}
+                # Los shards cerrados que el stream ya no lista salieron de la retención.
+                for shard_id in cerrados - vigentes:
+                    del estado[stream_arn][shard_id]
+            for shard in shards:
+                shard_id = shard["ShardId"]
+                padre = shard.get("ParentShardId")
+                # Los ShardId solo son únicos dentro de un stream.
+                if shard_id in cerrados or (stream_arn, shard_id) in hilos and hilos[stream_arn, shard_id].is_alive():
+                    continue
+                if padre in vigentes and padre not in cerrados:
+                    continue
+                hilo = threading.Thread(target=consumir_shard, args=(table_name, stream_arn, shard_id, estado),
+                                        name=f"cdc-{shard_id}", daemon=True)
+                hilos[stream_arn, shard_id] = hilo
+                hilo.start()
+        guardar_metricas(inicio)
+        detener.wait(CDC_DISCOVERY_SECONDS)
+    info("Deteniendo el consumidor; esperando a que terminen los lotes en curso.")
+    for hilo in hilos.values():
+        hilo.join()
+    guardar_metricas(inicio)
+
+if __name__ == "__main__":
+    signal.signal(signal.SIGTERM, lambda *_: detener.set())
+    signal.signal(signal.SIGINT, lambda *_: detener.set())
+    cdc_process()
+    exit_program(False)
@@ -1,12 +1,21 @@
-import json
 import boto3
-import pymysql
-import re
+import hashlib
+import json
+import pandas as pd
 import os
+import queue
+import random
 import sys
+import tempfile
 from dotenv import load_dotenv
 from loguru import logger
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from metricas import Metricas
+from tablas_mysql import TABLAS_MYSQL, conectar_mysql, sql_de
 
 load_dotenv()
 
@@ -16,13 +25,32 @@ AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 AWS_SESSION_TOKEN = os.getenv("AWS_SESSION_TOKEN")
 S3_OUTPUT_LOCATION = "s3://logs123123/"
 
-MYSQL_HOST = os.getenv("MYSQL_HOST")
-MYSQL_USER = os.getenv("MYSQL_USER")
-MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD")
-MYSQL_DATABASE = os.getenv("MYSQL_DATABASE")
-MYSQL_PORT = int(os.getenv("MYSQL_PORT", 3306))
+# Directorio de logs y, por defecto, de métricas y estado.
+LOGS_DIR = os.getenv("LOGS_DIR", "/logs_output")
+
+LOAD_BATCH_SIZE = int(os.getenv("LOAD_BATCH_SIZE", 1000))
+LOAD_METHOD = os.getenv("LOAD_METHOD", "executemany")
+LOAD_MODE = os.getenv("LOAD_MODE", "insert")
+MYSQL_LOAD_WORKERS = int(os.getenv("MYSQL_LOAD_WORKERS", 2))
+# Conexiones concurrentes por tabla; los chunks con al menos
+# MYSQL_SHARD_MIN_ROWS filas se reparten entre ellas por hash de la clave.
+MYSQL_LOAD_SHARDS = int(os.getenv("MYSQL_LOAD_SHARDS", 1))
+MYSQL_SHARD_MIN_ROWS = int(os.getenv("MYSQL_SHARD_MIN_ROWS", 10000))
+MYSQL_POOL_SIZE = int(os.getenv("MYSQL_POOL_SIZE", MYSQL_LOAD_WORKERS * MYSQL_LOAD_SHARDS))
+ETL_CHUNK_ROWS = int(os.getenv("ETL_CHUNK_ROWS", 50000))
+ATHENA_POLL_INITIAL_SECONDS = float(os.getenv("ATHENA_POLL_INITIAL_SECONDS", 0.25))
+ATHENA_POLL_MAX_SECONDS = float(os.getenv("ATHENA_POLL_MAX_SECONDS", 5))
+ATHENA_QUERY_TIMEOUT_SECONDS = float(os.getenv("ATHENA_QUERY_TIMEOUT_SECONDS", 900))
+METRICS_JSON_PATH = os.getenv("METRICS_JSON_PATH", f"{LOGS_DIR}/etl_metricas.json")
+METRICS_PROM_PATH = os.getenv("METRICS_PROM_PATH")
+METRICS_PUSHGATEWAY_URL = os.getenv("METRICS_PUSHGATEWAY_URL")
+# Manifiesto de contenido que escribe la ingesta por cada tabla de DynamoDB
+# (manifest_uri en tablas.json); local o s3://.
+INGESTA_MANIFEST_URI = os.getenv("INGESTA_MANIFEST_URI", f"{LOGS_DIR}/{{table_name}}_manifest.json")
+ETL_STATE_PATH = os.getenv("ETL_STATE_PATH", f"{LOGS_DIR}/etl_cargas.json")
+ETL_FORCE_RELOAD = os.getenv("ETL_FORCE_RELOAD", "false").lower() in ("1", "true", "yes")
 
-logs_file = "/logs_output/etl_log.log"
+logs_file = f"{LOGS_DIR}/etl_log.log"
 logger.add(logs_file)
 id = "ETL_Process"
 
@@ -34,6 +62,30 @@ athena = boto3.client(
     aws_session_token=AWS_SESSION_TOKEN,
 )
 
+s3 = boto3.client(
+    "s3",
+    region_name=AWS_REGION,
+    aws_access_key_id=AWS_ACCESS_KEY_ID,
+    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+    aws_session_token=AWS_SESSION_TOKEN,
+)
+
+# Tipos de Athena con equivalente directo en pandas; el resto (varchar, row,
+# array, map, ...) se lee como texto.
+TIPOS_ATHENA = {
+    "boolean": "boolean",
+    "tinyint": "Int8",
+    "smallint": "Int16",
+    "integer": "Int32",
+    "int": "Int32",
+    "bigint": "Int64",
+    "float": "float32",
+    "real": "float32",
+    "double": "float64",
+    "decimal": "float64",
+}
+FECHAS_ATHENA = ("date", "timestamp")
+
 def critical(message):
     logger.critical(f"{id} - {message}")
 def info(message):
@@ -49,6 +101,22 @@ def exit_program(early_exit=False):
     else:
         info('Programa terminado exitosamente.')
 
+if LOAD_METHOD not in ("executemany", "load_data"):
+    critical(f"LOAD_METHOD inválido: {LOAD_METHOD}. Valores permitidos: executemany, load_data.")
+    exit_program(True)
+if LOAD_MODE not in ("insert", "upsert", "swap"):
+    critical(f"LOAD_MODE inválido: {LOAD_MODE}. Valores permitidos: insert, upsert, swap.")
+    exit_program(True)
+if min(MYSQL_LOAD_WORKERS, MYSQL_LOAD_SHARDS, MYSQL_POOL_SIZE) < 1:
+    critical("MYSQL_LOAD_WORKERS, MYSQL_LOAD_SHARDS y MYSQL_POOL_SIZE deben ser mayores o iguales a 1.")
+    exit_program(True)
+
+# Limita cuántas tablas escriben en MySQL a la vez mientras las consultas de
+# Athena avanzan en paralelo.
+cargas_mysql = threading.BoundedSemaphore(MYSQL_LOAD_WORKERS)
+
+METRICAS = Metricas()
+
 def execute_athena_query(query):
     try:
         response = athena.start_query_execution(
@@ -61,210 +129,579 @@ def execute_athena_query(query):
         return query_execution_id
     except Exception as e:
         error(f"Error ejecutando la consulta en Athena: {e}")
-        exit_program(True)
+        return None
 
-def wait_for_query_to_complete(query_execution_id, max_retries=10, wait_time=5):
-    for attempt in range(max_retries):
+def wait_for_query_to_complete(query_execution_id, timeout=None, table_name=None):
+    """Espera a que termine la consulta, con sondeos que empiezan en
+    ATHENA_POLL_INITIAL_SECONDS y se duplican con jitter hasta
+    ATHENA_POLL_MAX_SECONDS. Si pasa timeout (ATHENA_QUERY_TIMEOUT_SECONDS por
+    defecto) sin terminar, la consulta se cancela y se devuelve False.
+    table_name solo etiqueta las métricas.
+    """
+    timeout = timeout or ATHENA_QUERY_TIMEOUT_SECONDS
+    limite = time.monotonic() + timeout
+    espera = ATHENA_POLL_INITIAL_SECONDS
+    sondeos = 0
+    while True:
         try:
             response = athena.get_query_execution(QueryExecutionId=query_execution_id)
-            state = response["QueryExecution"]["Status"]["State"]
+            sondeos += 1
+            METRICAS.sumar("athena_sondeos", tabla=table_name)
+            METRICAS.sumar("reintentos", response["ResponseMetadata"].get("RetryAttempts", 0), tabla=table_name)
+            status = response["QueryExecution"]["Status"]
+            state = status["State"]
             if state == "SUCCEEDED":
-                info(f"Consulta con ID {query_execution_id} completada exitosamente.")
+                # El tiempo en cola depende de la capacidad del workgroup y el de
+                # ejecución de la consulta; se registran por separado.
+                statistics = response["QueryExecution"].get("Statistics", {})
+                METRICAS.observar("etapa", statistics.get("QueryQueueTimeInMillis", 0) / 1000,
+                                  tabla=table_name, etapa="athena_cola")
+                METRICAS.observar("etapa", statistics.get("EngineExecutionTimeInMillis", 0) / 1000,
+                                  tabla=table_name, etapa="athena_ejecucion")
+                METRICAS.sumar("athena_bytes_escaneados", statistics.get("DataScannedInBytes", 0), tabla=table_name)
+                info(f"Consulta con ID {query_execution_id} completada exitosamente: "
+                     f"en cola {statistics.get('QueryQueueTimeInMillis', 0) / 1000:.2f} s, "
+                     f"ejecución {statistics.get('EngineExecutionTimeInMillis', 0) / 1000:.2f} s, "
+                     f"total {statistics.get('TotalExecutionTimeInMillis', 0) / 1000:.2f} s, "
+                     f"{statistics.get('DataScannedInBytes', 0)} bytes escaneados, {sondeos} sondeos.")
                 return True
             elif state in ["FAILED", "CANCELLED"]:
-                error(f"Consulta fallida o cancelada. Estado: {state}")
+                error(f"Consulta fallida o cancelada. Estado: {state}. {status.get('StateChangeReason', '')}")
                 return False
         except Exception as e:
             error(f"Error verificando el estado de la consulta: {e}")
-        time.sleep(wait_time)
-    error("La consulta en Athena excedió el tiempo de espera.")
+        restante = limite - time.monotonic()
+        if restante <= 0:
+            break
+        time.sleep(min(espera / 2 + random.uniform(0, espera / 2), restante))
+        espera = min(espera * 2, ATHENA_POLL_MAX_SECONDS)
+    error(f"La consulta {query_execution_id} en Athena excedió el tiempo de espera de {timeout:.0f} s; se cancela.")
+    try:
+        athena.stop_query_execution(QueryExecutionId=query_execution_id)
+    except Exception as e:
+        warning(f"No fue posible cancelar la consulta {query_execution_id}: {e}")
     return False
 
-def get_query_results_from_s3(query_execution_id):
+def leer_resultados(body, column_info, chunk_rows=None, defectos=None):
+    """Parsea el CSV de resultados de Athena en DataFrames tipados de chunk_rows filas.
+
+    Los tipos salen de column_info (ResultSetMetadata.ColumnInfo). Athena escribe
+    los NULL como campos vacíos, así que un texto vacío también se lee como nulo.
+    Es el único: textos como NA, null o None se conservan, y en un resultado de
+    una sola columna la línea vacía es una fila con NULL (ver bench_parser.py).
+    defectos es {columna: valor} de las columnas que la consulta ya pasó por
+    COALESCE: en ellas un nulo solo puede ser el defecto vacío y se rellena.
+    """
+    columnas = [col["Name"] for col in column_info]
+    tipos = {col["Name"]: TIPOS_ATHENA.get(col["Type"].lower(), "string") for col in column_info}
+    fechas = [col["Name"] for col in column_info if col["Type"].lower() in FECHAS_ATHENA]
+    for columna in fechas:
+        del tipos[columna]
+    # round_trip: el parser de floats por defecto de pandas puede cambiar los
+    # últimos dígitos de un double.
+    with pd.read_csv(body, header=0, names=columnas, dtype=tipos, parse_dates=fechas,
+                     keep_default_na=False, na_values=[""], skip_blank_lines=False,
+                     float_precision="round_trip", chunksize=chunk_rows or ETL_CHUNK_ROWS) as reader:
+        for chunk in reader:
+            yield chunk.fillna(defectos) if defectos else chunk
+
+def get_query_results_from_s3(query_execution_id, table_name=None):
+    """Devuelve un iterador de DataFrames sobre el CSV que Athena deja en S3_OUTPUT_LOCATION.
+
+    El esquema sale de los metadatos del resultado (una sola llamada a
+    get_query_results) y el archivo se lee en streaming con el lector C de
+    pandas, de a ETL_CHUNK_ROWS filas, así que la memoria no depende del tamaño
+    del resultado.
+    """
     try:
-        results = []
-        paginator = athena.get_paginator("get_query_results")
-        page_iterator = paginator.paginate(
-            QueryExecutionId=query_execution_id,
-            PaginationConfig={"PageSize": 1000}
-        )
-        for page in page_iterator:
-            rows = page["ResultSet"]["Rows"]
-            if not results:
-                column_info = [col["VarCharValue"] for col in rows[0]["Data"]]
-            for row in rows[1:]:
-                record = {column_info[i]: (row["Data"][i]["VarCharValue"] if "VarCharValue" in row["Data"][i] else None)
-                          for i in range(len(row["Data"]))}
-                results.append(record)
-        info(f"Resultados obtenidos: {len(results)} filas.")
-        return results
+        execution = athena.get_query_execution(QueryExecutionId=query_execution_id)["QueryExecution"]
+        metadata = athena.get_query_results(QueryExecutionId=query_execution_id, MaxResults=1)
+        column_info = metadata["ResultSet"]["ResultSetMetadata"]["ColumnInfo"]
+        bucket, key = execution["ResultConfiguration"]["OutputLocation"][len("s3://"):].split("/", 1)
+        response = s3.get_object(Bucket=bucket, Key=key)
+        info(f"Leyendo el resultado de la consulta {query_execution_id}: {response['ContentLength']} bytes.")
+        METRICAS.sumar("bytes_leidos", response["ContentLength"], tabla=table_name)
+        METRICAS.sumar("reintentos", response["ResponseMetadata"].get("RetryAttempts", 0), tabla=table_name)
+        # El tiempo de cada chunk incluye la descarga desde S3 y el parseo del CSV.
+        defectos = CONSULTAS.get(table_name, {}).get("defectos")
+        return METRICAS.iterar(leer_resultados(response["Body"], column_info, defectos=defectos), "etapa",
+                               tabla=table_name, etapa="leer")
     except Exception as e:
         error(f"Error obteniendo resultados desde Athena: {e}")
-        exit_program(True)
+        return None
 
-def load_to_mysql(data, table_name):
-    if not data:
-        warning(f"No hay datos para insertar en la tabla {table_name}.")
-        return
-    info(f"Iniciando la carga en la tabla {table_name}. Datos: {data}")
+def a_filas(data):
+    # PyMySQL recibe tuplas de tipos de Python; los nulos de pandas pasan a None.
+    data = data.astype(object).where(data.notna(), None)
+    return list(data.itertuples(index=False, name=None))
+
+class PoolMySQL:
+    """Conexiones a MySQL compartidas por todas las tablas de la ejecución.
+
+    Hay como máximo tamano conexiones prestadas a la vez; quien pide una cuando
+    están todas en uso espera a que se devuelva alguna. Las conexiones se
+    verifican con ping al prestarlas y, si el bloque que la usaba terminó con
+    una excepción, se cierran en lugar de volver al pool. Las que se abrieron
+    con otro LOAD_METHOD (local_infile distinto) también se cierran.
+    """
+
+    def __init__(self, tamano):
+        self.cupos = threading.BoundedSemaphore(tamano)
+        self.libres = queue.LifoQueue()
+
+    @contextmanager
+    def conexion(self):
+        self.cupos.acquire()
+        connection = None
+        try:
+            while connection is None:
+                try:
+                    connection = self.libres.get_nowait()
+                except queue.Empty:
+                    METRICAS.sumar("mysql_conexiones")
+                    connection = conectar_mysql(local_infile=LOAD_METHOD == "load_data")
+                    break
+                if getattr(connection, "local_infile", None) != (LOAD_METHOD == "load_data"):
+                    cerrar_conexion(connection)
+                    connection = None
+                    continue
+                connection.ping(reconnect=True)
+            yield connection
+        except BaseException:
+            if connection is not None:
+                cerrar_conexion(connection)
+                connection = None
+            raise
+        finally:
+            if connection is not None:
+                self.libres.put(connection)
+            self.cupos.release()
+
+    def cerrar(self):
+        while True:
+            try:
+                cerrar_conexion(self.libres.get_nowait())
+            except queue.Empty:
+                return
+
+def cerrar_conexion(connection):
     try:
-        connection = pymysql.connect(
-            host=MYSQL_HOST,
-            user=MYSQL_USER,
-            password=MYSQL_PASSWORD,
-            database=MYSQL_DATABASE,
-            port=MYSQL_PORT
+        connection.close()
+    except Exception:
+        pass
+
+pool = PoolMySQL(MYSQL_POOL_SIZE)
+# Carga los shards de las tablas grandes; cada tarea toma su conexión del pool.
+cargas_paralelas = ThreadPoolExecutor(max_workers=MYSQL_POOL_SIZE, thread_name_prefix="shard_mysql")
+
+def insertar_lote(cursor, table_name, columns, rows, reemplazar=False):
+    # PyMySQL reescribe executemany sobre un INSERT ... VALUES en sentencias de
+    # varias filas, así que cada lote cuesta pocas idas y vueltas al servidor.
+    placeholders = ", ".join(["%s"] * len(columns))
+    sql = f"{'REPLACE' if reemplazar else 'INSERT'} INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})"
+    cursor.executemany(sql, rows)
+
+def valor_tsv(value):
+    if value is None:
+        return "\\N"
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+def cargar_lote_infile(cursor, table_name, columns, rows, reemplazar=False):
+    # Con LOCAL, MySQL convierte los errores de clave duplicada en advertencias
+    # y descarta esas filas en lugar de fallar el lote.
+    with tempfile.NamedTemporaryFile("w", suffix=".tsv", encoding="utf-8", newline="\n") as f:
+        for row in rows:
+            f.write("\t".join(valor_tsv(value) for value in row))
+            f.write("\n")
+        f.flush()
+        cursor.execute(
+            f"LOAD DATA LOCAL INFILE %s {'REPLACE ' if reemplazar else ''}INTO TABLE {table_name} CHARACTER SET utf8mb4 "
+            f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' "
+            f"({', '.join(columns)})",
+            (f.name,),
         )
-        with connection.cursor() as cursor:
-            for record in data:
-                try:
-                    columns = ", ".join(record.keys())
-                    placeholders = ", ".join(["%s"] * len(record))
-                    sql = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
-                    info(f"Ejecutando query: {sql} con valores: {tuple(record.values())}")
-                    cursor.execute(sql, tuple(record.values()))
-                except Exception as e:
-                    error(f"Error insertando el registro {record} en {table_name}: {e}")
-            connection.commit()
-        info(f"Datos cargados exitosamente en la tabla {table_name}.")
+
+def cargar_lotes(connection, filas, table_name, columns, batch_size, reemplazar=False, fila_inicial=0, shard=None):
+    # Cada lote se confirma por separado; si uno falla se revierte, se registra y
+    # la carga sigue con el siguiente. Con shard, las filas se numeran dentro del shard.
+    cargar_lote = cargar_lote_infile if LOAD_METHOD == "load_data" else insertar_lote
+    cargadas = 0
+    fallidas = 0
+    with connection.cursor() as cursor:
+        for desde in range(0, len(filas), batch_size):
+            lote = filas[desde:desde + batch_size]
+            try:
+                cargar_lote(cursor, table_name, columns, lote, reemplazar)
+                connection.commit()
+                cargadas += len(lote)
+            except Exception as e:
+                connection.rollback()
+                fallidas += len(lote)
+                error(f"Error cargando las filas {fila_inicial + desde}-{fila_inicial + desde + len(lote) - 1} "
+                      f"{'' if shard is None else f'del shard {shard} '}en {table_name}: {e}")
+    return cargadas, fallidas
+
+def ejecutar_sql(connection, *sentencias):
+    with connection.cursor() as cursor:
+        for sql in sentencias:
+            cursor.execute(sql)
+    connection.commit()
+
+def aplicar_upsert(connection, table_name, staging, columns):
+    # Un solo INSERT ... SELECT reemplaza los N INSERT que chocaban con la clave.
+    lista = ", ".join(columns)
+    actualizaciones = ", ".join(f"{c} = VALUES({c})" for c in columns)
+    ejecutar_sql(
+        connection,
+        f"INSERT INTO {table_name} ({lista}) SELECT {lista} FROM {staging} "
+        f"ON DUPLICATE KEY UPDATE {actualizaciones}",
+        f"DROP TABLE {staging}",
+    )
+
+def aplicar_swap(connection, table_name, staging):
+    # RENAME TABLE con varios pares es atómico: los lectores ven la tabla
+    # anterior completa o la nueva completa, nunca una carga a medias.
+    anterior = f"{table_name}__anterior"
+    ejecutar_sql(
+        connection,
+        f"DROP TABLE IF EXISTS {anterior}",
+        f"RENAME TABLE {table_name} TO {anterior}, {staging} TO {table_name}",
+        f"DROP TABLE {anterior}",
+    )
+
+def claves_foraneas(connection, table_name):
+    """Nombres de las claves foráneas que salen de table_name o apuntan a ella."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT DISTINCT CONSTRAINT_NAME FROM information_schema.KEY_COLUMN_USAGE "
+            "WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL "
+            "AND (TABLE_NAME = %s OR REFERENCED_TABLE_NAME = %s)",
+            (table_name, table_name),
+        )
+        return sorted(fila[0] for fila in cursor.fetchall())
+
+def clave_primaria(connection, table_name):
+    with connection.cursor() as cursor:
+        cursor.execute(f"SHOW KEYS FROM {table_name} WHERE Key_name = 'PRIMARY'")
+        # Columnas: Table, Non_unique, Key_name, Seq_in_index, Column_name, ...
+        return [fila[4] for fila in sorted(cursor.fetchall(), key=lambda fila: fila[3])]
+
+def modo_de_carga(table_name):
+    # El modo de CONSULTAS tiene prioridad; las tablas fuera de CONSULTAS
+    # (benchmarks) usan LOAD_MODE.
+    return CONSULTAS.get(table_name, {}).get("modo") or LOAD_MODE
+
+def iniciar_carga(table_name, batch_size=None):
+    """Prepara una carga por chunks: en upsert o swap crea {table_name}__staging
+    con la misma estructura y, si hay shards, busca la clave primaria para
+    repartir las filas. Devuelve el estado de la carga.
+
+    CREATE TABLE ... LIKE no copia las claves foráneas y RENAME TABLE hace que
+    las que apuntan a la tabla sigan a la copia anterior, así que swap se
+    rechaza (ValueError) en tablas con claves foráneas en cualquier dirección.
+    """
+    batch_size = batch_size or LOAD_BATCH_SIZE
+    modo = modo_de_carga(table_name)
+    destino = table_name if modo == "insert" else f"{table_name}__staging"
+    with pool.conexion() as connection:
+        if modo == "swap":
+            foraneas = claves_foraneas(connection, table_name)
+            if foraneas:
+                raise ValueError(f"la tabla {table_name} tiene claves foráneas ({', '.join(foraneas)}) que swap "
+                                 f"no conserva; use el modo upsert o insert para esta tabla.")
+        if destino != table_name:
+            ejecutar_sql(connection, f"DROP TABLE IF EXISTS {destino}", f"CREATE TABLE {destino} LIKE {table_name}")
+        clave = clave_primaria(connection, table_name) if MYSQL_LOAD_SHARDS > 1 else []
+    info(f"Iniciando la carga en la tabla {destino} en lotes de {batch_size} ({LOAD_METHOD}, {modo}, "
+         f"hasta {MYSQL_LOAD_SHARDS} shards).")
+    return {
+        "table_name": table_name,
+        "destino": destino,
+        "modo": modo,
+        "clave": clave,
+        "batch_size": batch_size,
+        "columns": None,
+        "cargadas": 0,
+        "fallidas": 0,
+        "inicio": time.monotonic(),
+    }
+
+def repartir(data, clave, shards):
+    """Divide el chunk en hasta shards partes por hash de la clave primaria.
+
+    Las filas con la misma clave caen siempre en el mismo shard, así que dos
+    conexiones nunca compiten por la misma fila (ni se bloquean entre sí por
+    ella). Sin clave conocida se usa la fila completa.
+    """
+    if shards < 2 or len(data) < max(MYSQL_SHARD_MIN_ROWS, 2):
+        return [data]
+    columnas = [c for c in clave if c in data.columns] or list(data.columns)
+    grupos = pd.util.hash_pandas_object(data[columnas], index=False).to_numpy() % shards
+    return [data[grupos == n] for n in range(shards) if (grupos == n).any()]
+
+def cargar_shard(carga, data, fila_inicial=0, shard=None):
+    table_name = carga["table_name"]
+    with METRICAS.medir("etapa", tabla=table_name, etapa="convertir"):
+        filas = a_filas(data[carga["columns"]])
+    # En staging una clave repetida en los datos de origen reemplaza a la
+    # anterior en lugar de hacer fallar el lote.
+    with METRICAS.medir("etapa", tabla=table_name, etapa="mysql"):
+        try:
+            with pool.conexion() as connection:
+                return cargar_lotes(connection, filas, carga["destino"], carga["columns"], carga["batch_size"],
+                                    carga["destino"] != table_name, fila_inicial, shard)
+        except Exception as e:
+            # Error de conexión: cargar_lotes ya revierte los lotes que fallan.
+            error(f"Error cargando {len(filas)} filas{'' if shard is None else f' del shard {shard}'} "
+                  f"en {carga['destino']}: {e}")
+            return 0, len(filas)
+
+def cargar_chunk(carga, data):
+    # Cada shard se carga y confirma en su propia conexión del pool; el chunk
+    # termina cuando terminan todos, así que en memoria sigue habiendo un solo
+    # chunk por tabla.
+    if data.empty:
+        return
+    if carga["columns"] is None:
+        carga["columns"] = list(data.columns)
+    table_name = carga["table_name"]
+    shards = repartir(data, carga["clave"], MYSQL_LOAD_SHARDS)
+    if len(shards) == 1:
+        resultados = [cargar_shard(carga, data, carga["cargadas"] + carga["fallidas"])]
+    else:
+        futures = [cargas_paralelas.submit(cargar_shard, carga, shard, 0, n) for n, shard in enumerate(shards)]
+        resultados = [future.result() for future in futures]
+    cargadas = sum(r[0] for r in resultados)
+    fallidas = sum(r[1] for r in resultados)
+    METRICAS.sumar("filas_cargadas", cargadas, tabla=table_name)
+    METRICAS.sumar("filas_fallidas", fallidas, tabla=table_name)
+    carga["cargadas"] += cargadas
+    carga["fallidas"] += fallidas
+
+def terminar_carga(carga, completa=True):
+    """Aplica el staging sobre la tabla, si corresponde.
+
+    Si algún lote falló o la lectura no llegó al final (completa=False), el
+    staging no se aplica y la tabla queda como estaba. Devuelve (filas
+    cargadas, filas fallidas).
+    """
+    table_name = carga["table_name"]
+    destino = carga["destino"]
+    cargadas = carga["cargadas"]
+    fallidas = carga["fallidas"]
+    try:
+        if fallidas or not completa:
+            warning(f"Carga en la tabla {destino} con errores: {cargadas} filas cargadas, {fallidas} fallidas.")
+            if destino != table_name:
+                error(f"No se aplica {destino} sobre {table_name}; la tabla conserva los datos anteriores.")
+                return 0, cargadas + fallidas
+            return cargadas, fallidas
+        if destino != table_name:
+            with METRICAS.medir("etapa", tabla=table_name, etapa="aplicar"), pool.conexion() as connection:
+                if carga["modo"] == "upsert":
+                    aplicar_upsert(connection, table_name, destino, carga["columns"])
+                else:
+                    aplicar_swap(connection, table_name, destino)
     except Exception as e:
-        error(f"Error general cargando datos en MySQL: {e}")
-        exit_program(True)
-    finally:
-        connection.close()
+        error(f"Error aplicando la carga en la tabla {table_name}: {e}")
+        return 0, cargadas + fallidas
+    segundos = time.monotonic() - carga["inicio"]
+    info(f"Datos cargados exitosamente en la tabla {table_name}: {cargadas} filas "
+         f"en {segundos:.1f} s ({cargadas / max(segundos, 1e-9):,.0f} filas/s).")
+    return cargadas, fallidas
 
-def safely_convert_to_json(data_str):
+def load_to_mysql(data, table_name, batch_size=None):
+    """Carga un DataFrame completo; ver iniciar_carga y terminar_carga."""
+    if data.empty:
+        warning(f"No hay datos para insertar en la tabla {table_name}.")
+        return 0, 0
     try:
-        corrected_str = re.sub(r'(\w+)=([^,}\]]+)', r'"\1": "\2"', data_str)
-        corrected_str = corrected_str.replace("'", '"')
-        return json.loads(corrected_str)
+        carga = iniciar_carga(table_name, batch_size)
     except Exception as e:
-        error(f"Error convirtiendo a JSON: {data_str} - {e}")
-        return {}
+        error(f"Error preparando la carga en la tabla {table_name}: {e}")
+        return 0, len(data)
+    completa = False
+    try:
+        cargar_chunk(carga, data)
+        completa = True
+    finally:
+        resultado = terminar_carga(carga, completa)
+    return resultado
 
-def transform_reports(data):
-    transformed_data = []
-    for record in data:
-        tenant_id = record["tenant_id"]
-        report_id = record["report_id"]
-        data_json = safely_convert_to_json(record["data"])
-        transformed_data.append({
-            "tenant_id": tenant_id,
-            "report_id": report_id,
-            "total_sales": data_json.get("total_sales", 0),
-            "total_items": data_json.get("total_items", 0),
-        })
-    return transformed_data
-
-def transform_billing(data):
-    transformed_data = []
-    for record in data:
-        payment_json = safely_convert_to_json(record["payment_details"])
-        transformed_data.append({
-            "invoice_id": record["invoice_id"],
-            "tenant_id": record["tenant_id"],
-            "order_id": record["order_id"],
-            "method": payment_json.get("method", ""),
-            "amount": payment_json.get("amount", 0),
-            "status": record["status"],
-        })
-    return transformed_data
-
-def transform_inventory(data):
-    return [
-        {
-            "product_id": record["product_id"],
-            "tenant_id": record["tenant_id"],
-            "stock_available": float(record["stock_available"]),
-            "last_update": record["last_update"],
-        }
-        for record in data
-    ]
-
-def transform_productos(data):
-    return [
-        {
-            "product_id": record["product_id"],
-            "tenant_id": record["tenant_id"],
-            "name": record["name"],
-            "price": float(record["price"]),
-            "description": record["description"],
-        }
-        for record in data
-    ]
-def transform_order(data):
-    orders = []
-    order_products_set = set()
-    order_products = []
-
-    for record in data:
-        orders.append({
-            "order_id": record["order_id"],
-            "tenant_id": record["tenant_id"],
-            "user_id": record["user_id"],
-            "status": record["status"],
-        })
-        items_json = safely_convert_to_json(record["items"])
-        info(f"Procesando 'items' para la orden {record['order_id']}: {items_json}")
-        if isinstance(items_json, list):
-            for item in items_json:
-                product_id = item.get("product_id", None)
-                price = item.get("price", None)
-                if not product_id or price is None:
-                    warning(f"Producto inválido encontrado en 'items': {item}")
+# Una consulta por tabla de MySQL, armada con las proyecciones de
+# tablas_mysql.py. Athena proyecta solo las columnas que se cargan, con los
+# nombres de MySQL, y resuelve los campos anidados y el UNNEST de items, así
+# que cada chunk del resultado se carga tal cual. despues_de hace que una tabla
+# espere a que otra termine de cargarse (claves foráneas). fuentes son las
+# tablas de DynamoDB que lee la consulta: si ninguna cambió desde la última
+# carga exitosa, la tabla no se vuelve a cargar. modo es el LOAD_MODE de la
+# tabla: el de tablas_mysql.py si lo define, si no LOAD_MODE. defectos son los
+# valores de las columnas con COALESCE, que el CSV de Athena no distingue de
+# NULL cuando son textos vacíos.
+CONSULTAS = {
+    table_name: {
+        "sql": sql_de(table_name),
+        "fuentes": [tabla["fuente"]],
+        "despues_de": tabla.get("despues_de"),
+        "modo": tabla.get("modo", LOAD_MODE),
+        "defectos": {col["nombre"]: col["defecto"] for col in tabla.get("columnas", []) if col["defecto"] is not None},
+    }
+    for table_name, tabla in TABLAS_MYSQL.items()
+}
+invalidos = {t: c["modo"] for t, c in CONSULTAS.items() if c["modo"] not in ("insert", "upsert", "swap")}
+if invalidos:
+    critical(f"Modos de carga inválidos en tablas_mysql.py: {invalidos}. Valores permitidos: insert, upsert, swap.")
+    exit_program(True)
+
+def procesar_tabla(table_name, query_execution_id, terminadas):
+    # Lectura y carga avanzan de a un chunk: en memoria solo hay ETL_CHUNK_ROWS
+    # filas de la tabla a la vez.
+    try:
+        with METRICAS.medir("etapa", tabla=table_name, etapa="athena_espera"):
+            completada = wait_for_query_to_complete(query_execution_id, table_name=table_name)
+        if not completada:
+            warning(f"Consulta para {table_name} no completada.")
+            return False
+        chunks = get_query_results_from_s3(query_execution_id, table_name)
+        if chunks is None:
+            return False
+        dependencia = CONSULTAS[table_name].get("despues_de")
+        if dependencia:
+            with METRICAS.medir("etapa", tabla=table_name, etapa="espera_dependencia"):
+                terminadas[dependencia].wait()
+        carga = None
+        filas = 0
+        completa = False
+        fallidas = 0
+        with METRICAS.medir("etapa", tabla=table_name, etapa="espera_cargas_mysql"):
+            cargas_mysql.acquire()
+        try:
+            for results in chunks:
+                if results.empty:
                     continue
-                order_products_set.add((record["order_id"], product_id))
+                filas += len(results)
+                METRICAS.sumar("filas", len(results), tabla=table_name)
+                if carga is None:
+                    carga = iniciar_carga(table_name)
+                cargar_chunk(carga, results)
+            completa = True
+        except Exception as e:
+            error(f"Error procesando la tabla {table_name} después de {filas} filas: {e}")
+        finally:
+            if carga is not None:
+                fallidas = terminar_carga(carga, completa)[1]
+            cargas_mysql.release()
+        if completa and not filas:
+            warning(f"No se encontraron datos para la tabla {table_name}.")
         else:
-            warning(f"Formato inesperado en 'items' para la orden {record['order_id']}: {record['items']}")
+            info(f"Resultados procesados para {table_name}: {filas} filas.")
+        return completa and not fallidas
+    finally:
+        terminadas[table_name].set()
 
-    for order_id, product_id in order_products_set:
-        order_products.append({
-            "order_id": order_id,
-            "product_id": product_id,
-        })
+def guardar_metricas(inicio, fallidas):
+    METRICAS.fijar("ultima_ejecucion_timestamp_seconds", int(inicio))
+    METRICAS.fijar("ultima_ejecucion_exitosa", int(not fallidas))
+    for table_name in CONSULTAS:
+        METRICAS.fijar("tabla_completada", int(table_name not in fallidas), tabla=table_name)
+    try:
+        METRICAS.guardar("etl", METRICS_JSON_PATH, METRICS_PROM_PATH, METRICS_PUSHGATEWAY_URL,
+                         inicio=datetime.fromtimestamp(inicio, timezone.utc).isoformat(),
+                         segundos=round(time.time() - inicio, 3),
+                         tablas=list(CONSULTAS), fallidas=sorted(fallidas))
+        info(f"Métricas guardadas en {METRICS_JSON_PATH}.")
+    except Exception as e:
+        warning(f"No fue posible guardar las métricas: {e}")
 
-    info(f"Datos generados para 'OrderProductos': {order_products}")
-    return orders, order_products
+def leer_json(uri):
+    try:
+        if uri.startswith("s3://"):
+            bucket, key = uri[len("s3://"):].split("/", 1)
+            return json.loads(s3.get_object(Bucket=bucket, Key=key)["Body"].read())
+        with open(uri, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, s3.exceptions.NoSuchKey):
+        return {}
 
-def etl_process():
-    queries = {
-        "Reports": 'SELECT * FROM "AwsDataCatalog"."catalogo"."api-reportes-dev"',
-        "Billing": 'SELECT * FROM "AwsDataCatalog"."catalogo"."billingservice-dev"',
-        "Inventory": 'SELECT * FROM "AwsDataCatalog"."catalogo"."inventoryservice-dev"',
-        "Order": 'SELECT * FROM "AwsDataCatalog"."catalogo"."orderservice-dev"',
-        "Productos": 'SELECT * FROM "AwsDataCatalog"."catalogo"."productservice-dev"'
-    }
-    for table_name, query in queries.items():
+def guardar_json(path, data):
+    tmp_file = f"{path}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, path)
+
+def version_de_carga(consulta):
+    """Hash de lo que determina el contenido de la tabla en MySQL: la consulta,
+    el modo de carga, los defectos y el hash de contenido de cada fuente según
+    el manifiesto de la ingesta. None si alguna fuente no tiene manifiesto.
+    """
+    partes = [consulta["sql"], consulta["modo"], json.dumps(consulta.get("defectos"), sort_keys=True)]
+    for fuente in consulta.get("fuentes", []):
         try:
-            logger.info(f"Procesando tabla: {table_name}")
-            query_execution_id = execute_athena_query(query)
-            if not wait_for_query_to_complete(query_execution_id):
-                logger.warning(f"Consulta para {table_name} no completada.")
-                continue
-            data = get_query_results_from_s3(query_execution_id)
-            if not data:
-                logger.warning(f"No se encontraron datos para la tabla {table_name}.")
-                continue
-            if table_name == "Reports":
-                transformed_data = transform_reports(data)
-                load_to_mysql(transformed_data, "Reports")
-            elif table_name == "Billing":
-                transformed_data = transform_billing(data)
-                load_to_mysql(transformed_data, "Billing")
-            elif table_name == "Inventory":
-                transformed_data = transform_inventory(data)
-                load_to_mysql(transformed_data, "Inventory")
-            elif table_name == "Order":
-                orders, order_products = transform_order(data)
-                load_to_mysql(orders, "Orders")
-                load_to_mysql(order_products, "OrderProductos")
-            elif table_name == "Productos":
-                transformed_data = transform_productos(data)
-                load_to_mysql(transformed_data, "Productos")
-            else:
-                logger.error(f"Transformación no definida para la tabla {table_name}.")
+            manifiesto = leer_json(INGESTA_MANIFEST_URI.format(table_name=fuente))
         except Exception as e:
-            logger.error(f"Error procesando la tabla {table_name}: {e}")
+            warning(f"No fue posible leer el manifiesto de {fuente}: {e}")
+            return None
+        if not manifiesto.get("hash"):
+            return None
+        partes.append(f"{fuente}={manifiesto['hash']}")
+    if len(partes) == 3:
+        return None
+    return hashlib.sha256("\n".join(partes).encode("utf-8")).hexdigest()
+
+def etl_process():
+    # Todas las consultas se lanzan de entrada; cada tabla se carga en cuanto
+    # termina la suya, sin esperar a las demás. Las tablas cuyas fuentes no
+    # cambiaron desde la última carga exitosa no se consultan ni se cargan.
+    inicio = time.time()
+    terminadas = {table_name: threading.Event() for table_name in CONSULTAS}
+    cargas = leer_json(ETL_STATE_PATH)
+    versiones = {table_name: version_de_carga(consulta) for table_name, consulta in CONSULTAS.items()}
+    query_ids = {}
+    for table_name, consulta in CONSULTAS.items():
+        version = versiones[table_name]
+        if not ETL_FORCE_RELOAD and version and cargas.get(table_name, {}).get("version") == version:
+            info(f"Tabla {table_name} sin cambios desde la carga del {cargas[table_name]['fecha']}; se omite.")
+            METRICAS.sumar("tablas_omitidas", tabla=table_name)
+            terminadas[table_name].set()
+            continue
+        query_execution_id = execute_athena_query(consulta["sql"])
+        if query_execution_id:
+            query_ids[table_name] = query_execution_id
+        else:
+            terminadas[table_name].set()
+    fallidas = {table_name for table_name in CONSULTAS
+                if table_name not in query_ids and not terminadas[table_name].is_set()}
+    with ThreadPoolExecutor(max_workers=len(CONSULTAS)) as executor:
+        futures = {
+            executor.submit(procesar_tabla, table_name, query_execution_id, terminadas): table_name
+            for table_name, query_execution_id in query_ids.items()
+        }
+        for future in as_completed(futures):
+            table_name = futures[future]
+            try:
+                if future.result():
+                    info(f"Tabla {table_name} procesada.")
+                    if versiones[table_name]:
+                        # La versión se calculó antes de consultar: si la ingesta
+                        # cambió algo durante la carga, la próxima ejecución recarga.
+                        cargas[table_name] = {"version": versiones[table_name],
+                                              "fecha": datetime.now(timezone.utc).isoformat()}
+                        try:
+                            guardar_json(ETL_STATE_PATH, cargas)
+                        except Exception as e:
+                            warning(f"No fue posible guardar el estado de cargas en {ETL_STATE_PATH}: {e}")
+                else:
+                    fallidas.add(table_name)
+            except Exception as e:
+                error(f"Error procesando la tabla {table_name}: {e}")
+                fallidas.add(table_name)
+            METRICAS.observar("tabla", time.time() - inicio, tabla=table_name)
+    pool.cerrar()
+    guardar_metricas(inicio, fallidas)
+    if fallidas:
+        critical(f"Tablas que no se completaron: {sorted(fallidas)}")
+        exit_program(True)
 
 if __name__ == "__main__":
     etl_process()
+    exit_program(False)
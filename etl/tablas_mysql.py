@@ -0,0 +1,168 @@
+"""Tablas de MySQL que se cargan desde DynamoDB y conexión a MySQL.
+
+Lo comparten la carga completa (main.py arma con estas proyecciones las
+consultas de Athena) y el consumidor CDC (cdc.py las aplica a la imagen nueva
+de cada item), así que una columna se agrega o se cambia en un solo lugar.
+Importarlo no crea clientes de AWS ni valida la configuración del ETL.
+"""
+import os
+
+import pymysql
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MYSQL_HOST = os.getenv("MYSQL_HOST")
+MYSQL_USER = os.getenv("MYSQL_USER")
+MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD")
+MYSQL_DATABASE = os.getenv("MYSQL_DATABASE")
+MYSQL_PORT = int(os.getenv("MYSQL_PORT", 3306))
+
+CATALOGO = '"AwsDataCatalog"."catalogo"'
+
+def conectar_mysql(local_infile=False):
+    connection = pymysql.connect(
+        host=MYSQL_HOST,
+        user=MYSQL_USER,
+        password=MYSQL_PASSWORD,
+        database=MYSQL_DATABASE,
+        port=MYSQL_PORT,
+        local_infile=local_infile,
+    )
+    # local_infile se negocia al conectar; el pool de main.py lo usa para
+    # descartar conexiones abiertas con otro LOAD_METHOD.
+    connection.local_infile = local_infile
+    return connection
+
+# Tipo de una columna -> (CAST en Athena, conversión del valor de DynamoDB).
+TIPOS = {
+    "double": ("DOUBLE", float),
+    "bigint": ("BIGINT", int),
+}
+
+def columna(nombre, ruta=None, defecto=None, tipo=None):
+    """Columna de MySQL que sale del campo ruta del item (nombre si no se indica).
+
+    Los campos anidados se separan con puntos, igual que en Athena. Un campo
+    ausente o nulo se carga como defecto.
+    """
+    return {"nombre": nombre, "ruta": ruta or nombre, "defecto": defecto, "tipo": tipo}
+
+def expresion_athena(col):
+    expresion = col["ruta"]
+    if col["tipo"]:
+        expresion = f"CAST({expresion} AS {TIPOS[col['tipo']][0]})"
+    if col["defecto"] is not None:
+        defecto = f"'{col['defecto']}'" if isinstance(col["defecto"], str) else col["defecto"]
+        expresion = f"COALESCE({expresion}, {defecto})"
+    return expresion if expresion == col["nombre"] else f"{expresion} AS {col['nombre']}"
+
+def valor_de_item(item, col):
+    valor = item
+    for campo in col["ruta"].split("."):
+        valor = valor.get(campo) if isinstance(valor, dict) else None
+    if valor is None:
+        return col["defecto"]
+    return TIPOS[col["tipo"]][1](valor) if col["tipo"] else valor
+
+def filas_orden_productos(item):
+    productos = {
+        producto.get("product_id")
+        for producto in item.get("items") or []
+        if isinstance(producto, dict) and producto.get("product_id") and producto.get("price") is not None
+    }
+    return [{"order_id": item.get("order_id"), "product_id": product_id} for product_id in sorted(productos)]
+
+# Una entrada por tabla de MySQL, en el orden de las claves foráneas: la carga
+# completa espera a despues_de y el CDC inserta de arriba hacia abajo y borra
+# de abajo hacia arriba. fuente es la tabla de DynamoDB que la alimenta y clave
+# son las columnas de MySQL que identifican las filas de un item (salen de las
+# claves de DynamoDB). Con reemplazar, el CDC borra y vuelve a insertar las
+# filas del item en cada cambio (una orden puede perder productos). Las tablas
+# que no son una proyección columna a columna definen su sql y sus filas. modo,
+# si está, es el modo de la carga completa de main.py para esa tabla (insert,
+# upsert o swap) en lugar de LOAD_MODE; swap no admite claves foráneas.
+TABLAS_MYSQL = {
+    "Reports": {
+        "fuente": "api-reportes-dev",
+        "clave": ["tenant_id", "report_id"],
+        "columnas": [
+            columna("tenant_id"),
+            columna("report_id"),
+            columna("total_sales", "data.total_sales", defecto=0, tipo="double"),
+            columna("total_items", "data.total_items", defecto=0, tipo="bigint"),
+        ],
+    },
+    "Billing": {
+        "fuente": "billingService-dev",
+        "clave": ["tenant_id", "invoice_id"],
+        "columnas": [
+            columna("invoice_id"),
+            columna("tenant_id"),
+            columna("order_id"),
+            columna("method", "payment_details.method", defecto=""),
+            columna("amount", "payment_details.amount", defecto=0, tipo="double"),
+            columna("status"),
+        ],
+    },
+    "Inventory": {
+        "fuente": "inventoryService-dev",
+        "clave": ["tenant_id", "product_id"],
+        "columnas": [
+            columna("product_id"),
+            columna("tenant_id"),
+            columna("stock_available", tipo="double"),
+            columna("last_update"),
+        ],
+    },
+    "Orders": {
+        "fuente": "orderService-dev",
+        "clave": ["tenant_id", "order_id"],
+        "columnas": [
+            columna("order_id"),
+            columna("tenant_id"),
+            columna("user_id"),
+            columna("status"),
+        ],
+    },
+    "OrderProductos": {
+        "fuente": "orderService-dev",
+        "clave": ["order_id"],
+        "reemplazar": True,
+        "despues_de": "Orders",
+        "sql": f"""
+            SELECT DISTINCT o.order_id, t.item.product_id AS product_id
+            FROM {CATALOGO}."orderservice-dev" AS o
+            CROSS JOIN UNNEST(o.items) AS t (item)
+            WHERE t.item.product_id IS NOT NULL AND t.item.product_id <> '' AND t.item.price IS NOT NULL
+        """,
+        "filas": filas_orden_productos,
+    },
+    "Productos": {
+        "fuente": "productService-dev",
+        "clave": ["tenant_id", "product_id"],
+        "columnas": [
+            columna("product_id"),
+            columna("tenant_id"),
+            columna("name"),
+            columna("price", tipo="double"),
+            columna("description"),
+        ],
+    },
+}
+
+def sql_de(table_name):
+    tabla = TABLAS_MYSQL[table_name]
+    if "sql" in tabla:
+        return tabla["sql"]
+    columnas = ", ".join(expresion_athena(col) for col in tabla["columnas"])
+    return f'SELECT {columnas} FROM {CATALOGO}."{tabla["fuente"].lower()}"'
+
+def filas_de(table_name, item):
+    tabla = TABLAS_MYSQL[table_name]
+    if "filas" in tabla:
+        return tabla["filas"](item)
+    return [{col["nombre"]: valor_de_item(item, col) for col in tabla["columnas"]}]
+
+def tablas_de_fuente(fuente):
+    return [table_name for table_name, tabla in TABLAS_MYSQL.items() if tabla["fuente"] == fuente]
@@ -0,0 +1,91 @@
+"""Microbenchmark: TransformationInjector + TypeDeserializer vs deserializador.items_a_columnas.
+
+Uso: python bench_deserializador.py [--paginas N] [--items-por-pagina N]
+
+Genera páginas sintéticas con la forma de orderService-dev y mide el tiempo
+hasta obtener el DataFrame de cada página con el camino anterior, con el
+deserializador genérico y con el guiado por esquema. No necesita AWS.
+"""
+import argparse
+import copy
+import os
+import random
+import sys
+import time
+
+import boto3
+import pandas as pd
+from boto3.dynamodb.transform import TransformationInjector
+from boto3.dynamodb.types import TypeDeserializer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from deserializador import items_a_columnas  # noqa: E402
+from esquemas import ESQUEMAS  # noqa: E402
+
+ESQUEMA_PEDIDOS = ESQUEMAS['orderService-dev']
+
+
+def item_pedido(n):
+    return {
+        'tenant_id': {'S': f'tenant-{n % 20}'},
+        'order_id': {'S': f'order-{n:08d}'},
+        'user_id': {'S': f'user-{n % 5000}'},
+        'status': {'S': random.choice(['PENDING', 'PAID', 'SHIPPED'])},
+        'created_at': {'S': f'2024-{n % 12 + 1:02d}-{n % 28 + 1:02d}T10:00:00'},
+        'items': {'L': [
+            {'M': {
+                'product_id': {'S': f'prod-{random.randint(1, 500)}'},
+                'price': {'N': f'{random.uniform(1, 300):.2f}'},
+                'quantity': {'N': str(random.randint(1, 5))},
+            }}
+            for _ in range(random.randint(1, 4))
+        ]},
+    }
+
+
+def medir(nombre, paginas, convertir):
+    inicio = time.perf_counter()
+    filas = 0
+    for page in paginas:
+        filas += len(convertir(page))
+    segundos = time.perf_counter() - inicio
+    print(f'{nombre:<28} {segundos:8.3f} s  {filas / segundos:12,.0f} filas/s')
+    return segundos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--paginas', type=int, default=50)
+    parser.add_argument('--items-por-pagina', type=int, default=2000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    paginas = [
+        {'Items': [item_pedido(p * args.items_por_pagina + n) for n in range(args.items_por_pagina)]}
+        for p in range(args.paginas)
+    ]
+    # TransformationInjector reescribe la página en el lugar; cada camino recibe su copia.
+    copias = copy.deepcopy(paginas)
+
+    client = boto3.client('dynamodb', region_name='us-east-1')
+    service_model = client._service_model.operation_model('Scan')
+    trans = TransformationInjector(deserializer=TypeDeserializer())
+
+    def actual(page):
+        trans.inject_attribute_value_output(page, service_model)
+        return pd.DataFrame.from_records(page['Items'])
+
+    def columnar(page):
+        return pd.DataFrame(items_a_columnas(page['Items']))
+
+    def columnar_esquema(page):
+        return pd.DataFrame(items_a_columnas(page['Items'], ESQUEMA_PEDIDOS))
+
+    base = medir('TransformationInjector', copias, actual)
+    generico = medir('items_a_columnas', paginas, columnar)
+    esquema = medir('items_a_columnas + esquema', paginas, columnar_esquema)
+    print(f'Aceleración: {base / generico:.2f}x genérico, {base / esquema:.2f}x con esquema')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Deserialización directa de páginas de DynamoDB a columnas.
+
+Reemplaza TransformationInjector + TypeDeserializer en el camino caliente: en
+lugar de reescribir cada item como un dict de valores Python y luego pasarlo a
+pandas, recorre los AttributeValue una sola vez y llena una lista por columna.
+Los números se devuelven como int o float (no Decimal) y los sets como listas,
+de modo que pandas y pyarrow los convierten sin conversiones adicionales.
+
+Si se pasa un esquema de pyarrow, cada columna conocida usa un convertidor
+generado para su tipo, sin inspeccionar el tipo de cada AttributeValue; los
+valores que no coinciden con el esquema vuelven al camino genérico.
+"""
+import pyarrow as pa
+
+
+def numero(valor):
+    if '.' in valor or 'e' in valor or 'E' in valor:
+        return float(valor)
+    return int(valor)
+
+
+def valor_python(attribute_value):
+    if 'S' in attribute_value:
+        return attribute_value['S']
+    if 'N' in attribute_value:
+        return numero(attribute_value['N'])
+    if 'M' in attribute_value:
+        return {k: valor_python(v) for k, v in attribute_value['M'].items()}
+    if 'L' in attribute_value:
+        return [valor_python(v) for v in attribute_value['L']]
+    if 'BOOL' in attribute_value:
+        return attribute_value['BOOL']
+    if 'NULL' in attribute_value:
+        return None
+    if 'NS' in attribute_value:
+        return [numero(v) for v in attribute_value['NS']]
+    if 'SS' in attribute_value:
+        return list(attribute_value['SS'])
+    if 'BS' in attribute_value:
+        return list(attribute_value['BS'])
+    if 'B' in attribute_value:
+        return attribute_value['B']
+    raise TypeError(f'Tipo de DynamoDB no soportado: {list(attribute_value)}')
+
+
+def convertidor(tipo):
+    if pa.types.is_string(tipo) or pa.types.is_timestamp(tipo):
+        return lambda attribute_value: attribute_value['S']
+    if pa.types.is_floating(tipo):
+        return lambda attribute_value: float(attribute_value['N'])
+    if pa.types.is_integer(tipo):
+        return lambda attribute_value: int(attribute_value['N'])
+    if pa.types.is_boolean(tipo):
+        return lambda attribute_value: attribute_value['BOOL']
+    if pa.types.is_list(tipo):
+        elemento = convertidor(tipo.value_type)
+        return lambda attribute_value: [elemento(v) for v in attribute_value['L']]
+    if pa.types.is_struct(tipo):
+        campos = [(campo.name, convertidor(campo.type)) for campo in tipo]
+
+        def convertir_struct(attribute_value):
+            mapa = attribute_value['M']
+            return {nombre: convertir(mapa[nombre]) if nombre in mapa else None for nombre, convertir in campos}
+        return convertir_struct
+    return valor_python
+
+
+def items_a_columnas(items, esquema=None):
+    """Convierte los Items crudos de una página en un dict columna -> lista.
+
+    Las filas sin un atributo quedan con None en esa columna.
+    """
+    convertidores = {campo.name: convertidor(campo.type) for campo in esquema} if esquema is not None else {}
+    total = len(items)
+    columnas = {}
+    for fila, item in enumerate(items):
+        for nombre, attribute_value in item.items():
+            columna = columnas.get(nombre)
+            if columna is None:
+                columna = columnas[nombre] = [None] * total
+            convertir = convertidores.get(nombre, valor_python)
+            try:
+                columna[fila] = convertir(attribute_value)
+            except (KeyError, TypeError, ValueError):
+                columna[fila] = valor_python(attribute_value)
+    return columnas
@@ -0,0 +1,55 @@
+import pyarrow as pa
+
+ITEM_PEDIDO = pa.struct([
+    ('product_id', pa.string()),
+    ('price', pa.float64()),
+    ('quantity', pa.int64()),
+])
+
+# Esquemas explícitos para la salida columnar. Las tablas que no aparecen aquí
+# usan el esquema inferido por pyarrow.
+ESQUEMAS = {
+    'api-reportes-dev': pa.schema([
+        ('tenant_id', pa.string()),
+        ('report_id', pa.string()),
+        ('data', pa.struct([
+            ('total_sales', pa.float64()),
+            ('total_items', pa.int64()),
+        ])),
+        ('created_at', pa.timestamp('ms', tz='UTC')),
+    ]),
+    'billingService-dev': pa.schema([
+        ('invoice_id', pa.string()),
+        ('tenant_id', pa.string()),
+        ('order_id', pa.string()),
+        ('status', pa.string()),
+        ('payment_details', pa.struct([
+            ('method', pa.string()),
+            ('amount', pa.float64()),
+        ])),
+        ('created_at', pa.timestamp('ms', tz='UTC')),
+    ]),
+    'inventoryService-dev': pa.schema([
+        ('product_id', pa.string()),
+        ('tenant_id', pa.string()),
+        ('product_name', pa.string()),
+        ('stock_available', pa.float64()),
+        ('last_update', pa.string()),
+    ]),
+    'orderService-dev': pa.schema([
+        ('order_id', pa.string()),
+        ('tenant_id', pa.string()),
+        ('user_id', pa.string()),
+        ('status', pa.string()),
+        ('items', pa.list_(ITEM_PEDIDO)),
+        ('created_at', pa.timestamp('ms', tz='UTC')),
+    ]),
+    'productService-dev': pa.schema([
+        ('product_id', pa.string()),
+        ('tenant_id', pa.string()),
+        ('name', pa.string()),
+        ('description', pa.string()),
+        ('price', pa.float64()),
+        ('created_at', pa.timestamp('ms', tz='UTC')),
+    ]),
+}
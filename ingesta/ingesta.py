@@ -0,0 +1,1535 @@
+import argparse
+import hashlib
+import json
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.orc as orc
+import pyarrow.parquet as pq
+import boto3
+import os
+import queue
+import re
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from loguru import logger
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from boto3.s3.transfer import TransferConfig
+from dotenv import load_dotenv
+from deserializador import items_a_columnas
+from esquemas import ESQUEMAS
+from metricas import Metricas
+
+load_dotenv()
+
+AWS_REGION = os.environ.get('AWS_REGION')
+AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID')
+AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY')
+AWS_SESSION_TOKEN = os.environ.get('AWS_SESSION_TOKEN')
+# Directorio de logs y, por defecto, de checkpoints, estado y métricas.
+LOGS_DIR = os.environ.get('LOGS_DIR', '/logs_output')
+MANIFEST_PATH = os.environ.get('MANIFEST_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tablas.json'))
+BUCKET_NAME = os.environ.get('BUCKET_NAME')
+SCAN_WORKERS = int(os.environ.get('SCAN_WORKERS', 4))
+SCAN_EXECUTOR = os.environ.get('SCAN_EXECUTOR', 'thread')
+TRANSFORM_WORKERS = int(os.environ.get('TRANSFORM_WORKERS', 2))
+SERIALIZE_WORKERS = int(os.environ.get('SERIALIZE_WORKERS', 2))
+UPLOAD_WORKERS = int(os.environ.get('UPLOAD_WORKERS', 4))
+PIPELINE_QUEUE_SIZE = int(os.environ.get('PIPELINE_QUEUE_SIZE', 8))
+# Las colas que llevan objetos enteros (antes y después de serializar) son más
+# cortas: cada elemento puede pesar cientos de MB.
+PIPELINE_BATCH_QUEUE_SIZE = int(os.environ.get('PIPELINE_BATCH_QUEUE_SIZE', 1))
+# Tope de bytes crudos de DynamoDB que el agrupador retiene entre todas las
+# particiones, sin importar target_object_mb: con Parquet la razón
+# serializado/crudo ronda 0.12 y un objeto de 128 MB pediría más de 1 GB en
+# memoria. Al alcanzarlo se cierra un objeto por partición.
+BATCH_MAX_MB = int(os.environ.get('BATCH_MAX_MB', 256))
+PIPELINE_METRICS_SECONDS = int(os.environ.get('PIPELINE_METRICS_SECONDS', 30))
+MULTIPART_CHUNK_MB = int(os.environ.get('MULTIPART_CHUNK_MB', 8))
+SPOOL_MAX_MB = int(os.environ.get('SPOOL_MAX_MB', 64))
+ATHENA_DATABASE = os.environ.get('ATHENA_DATABASE', 'catalogo')
+METRICS_JSON_PATH = os.environ.get('METRICS_JSON_PATH', f'{LOGS_DIR}/ingesta_metricas.json')
+METRICS_PROM_PATH = os.environ.get('METRICS_PROM_PATH')
+METRICS_PUSHGATEWAY_URL = os.environ.get('METRICS_PUSHGATEWAY_URL')
+
+# Configuración por tabla: valor por defecto, sobreescrito por la variable de
+# entorno del mismo nombre en mayúsculas y luego por la entrada del manifiesto.
+DEFAULTS_TABLA = {
+    'flatten': [],
+    'scan_segments': 1,
+    'incremental_column': None,
+    'incremental_overlap_seconds': 60,
+    'checkpoint_uri': f'{LOGS_DIR}/{{table_name}}_checkpoint.json',
+    'scan_state_uri': f'{LOGS_DIR}/{{table_name}}_scan_state',
+    'manifest_uri': f'{LOGS_DIR}/{{table_name}}_manifest.json',
+    'output_format': 'json',
+    'output_compression': 'snappy',
+    'row_group_rows': 100000,
+    'target_object_mb': 128,
+    'target_object_rows': 0,
+    'datetime_columns': ['created_at'],
+    'partition_by': ['tenant_id', 'dt'],
+    # Con scan_capacity_percent la ingesta lee la capacidad con DescribeTable,
+    # así que el rol necesita dynamodb:DescribeTable además de dynamodb:Scan; si
+    # no lo tiene, el scan queda limitado solo por scan_max_rcu. En 0 no se llama.
+    'scan_capacity_percent': 50,
+    'scan_max_rcu': 0,
+}
+
+EXTENSIONES = {'json': 'json', 'parquet': 'parquet', 'orc': 'orc'}
+FORMATOS_DDL = {
+    'json': "ROW FORMAT SERDE 'org.openx.data.jsonserde.JsonSerDe'",
+    'parquet': 'STORED AS PARQUET',
+    'orc': 'STORED AS ORC',
+}
+# Valor de partición para registros sin la columna, igual que en Hive.
+HIVE_DEFAULT_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+
+id = "Ingesta"
+logger.add(f"{LOGS_DIR}/ingesta_log.log")
+
+def critical(message, tabla=None):
+    logger.bind(tabla=tabla).critical(f"{tabla or id} - {message}")
+def info(message, tabla=None):
+    logger.bind(tabla=tabla).info(f"{tabla or id} - {message}")
+def error(message, tabla=None):
+    logger.bind(tabla=tabla).error(f"{tabla or id} - {message}")
+def warning(message, tabla=None):
+    logger.bind(tabla=tabla).warning(f"{tabla or id} - {message}")
+def exit_program(early_exit=False):
+    if early_exit:
+        warning('Saliendo del programa antes de la ejecución debido a un error previo.')
+        sys.exit(1)
+    else:
+        info('Programa terminado exitosamente.')
+
+def valor_por_defecto(clave, valor):
+    entorno = os.environ.get(clave.upper())
+    if entorno is None:
+        return valor
+    if isinstance(valor, bool):
+        return entorno.lower() in ('1', 'true', 'yes')
+    if isinstance(valor, int):
+        return int(entorno)
+    if isinstance(valor, list):
+        return [v for v in entorno.split(',') if v]
+    return entorno or None
+
+def cargar_manifiesto(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifiesto = json.load(f)
+    except Exception as e:
+        critical(f'No fue posible leer el manifiesto de tablas {path}. Excepción: {e}')
+        exit_program(True)
+
+    defaults = {clave: valor_por_defecto(clave, valor) for clave, valor in DEFAULTS_TABLA.items()}
+    defaults['bucket_name'] = BUCKET_NAME or manifiesto.get('bucket_name')
+    tablas = []
+    for entrada in manifiesto.get('tables', []):
+        tabla = dict(defaults, **entrada)
+        if not tabla.get('table_name'):
+            critical(f'Entrada del manifiesto sin table_name: {entrada}')
+            exit_program(True)
+        for clave in ('checkpoint_uri', 'scan_state_uri', 'manifest_uri'):
+            tabla[clave] = tabla[clave].format(table_name=tabla['table_name'])
+        tablas.append(tabla)
+    return tablas
+
+def validar_tabla(tabla):
+    nombre = tabla['table_name']
+    if not tabla['bucket_name']:
+        critical('No se encontró el nombre del bucket de S3.', nombre)
+        return False
+    if tabla['scan_segments'] < 1:
+        critical('scan_segments debe ser mayor o igual a 1.', nombre)
+        return False
+    if not 0 <= tabla['scan_capacity_percent'] <= 100 or tabla['scan_max_rcu'] < 0:
+        critical('scan_capacity_percent debe estar entre 0 y 100 y scan_max_rcu no puede ser negativo.', nombre)
+        return False
+    if tabla['incremental_overlap_seconds'] < 0:
+        critical('incremental_overlap_seconds no puede ser negativo.', nombre)
+        return False
+    if tabla['output_format'] not in EXTENSIONES:
+        critical(f"output_format inválido: {tabla['output_format']}. Valores permitidos: {', '.join(EXTENSIONES)}.", nombre)
+        return False
+    return True
+
+if not all([AWS_REGION, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_SESSION_TOKEN]):
+    critical('Faltan credenciales de AWS en las variables de entorno.')
+    exit_program(True)
+if min(SCAN_WORKERS, TRANSFORM_WORKERS, SERIALIZE_WORKERS, UPLOAD_WORKERS, PIPELINE_QUEUE_SIZE,
+       PIPELINE_BATCH_QUEUE_SIZE, BATCH_MAX_MB) < 1:
+    critical('SCAN_WORKERS, TRANSFORM_WORKERS, SERIALIZE_WORKERS, UPLOAD_WORKERS, PIPELINE_QUEUE_SIZE, '
+             'PIPELINE_BATCH_QUEUE_SIZE y BATCH_MAX_MB deben ser mayores o iguales a 1.')
+    exit_program(True)
+if SCAN_EXECUTOR not in ('thread', 'process'):
+    critical(f"SCAN_EXECUTOR inválido: {SCAN_EXECUTOR}. Valores permitidos: thread, process.")
+    exit_program(True)
+
+TABLAS = cargar_manifiesto(MANIFEST_PATH)
+for tabla in TABLAS:
+    logger.add(f"{LOGS_DIR}/{tabla['table_name']}_log.log",
+               filter=lambda record, nombre=tabla['table_name']: record['extra'].get('tabla') == nombre)
+if not TABLAS or not all(validar_tabla(tabla) for tabla in TABLAS):
+    critical('El manifiesto de tablas no es válido.')
+    exit_program(True)
+
+# Un solo cliente por servicio para todas las tablas; el pool de conexiones se
+# dimensiona para los segmentos concurrentes y sus subidas.
+def conectar_s3():
+    try:
+        s3 = boto3.client(
+            's3',
+            region_name=AWS_REGION,
+            aws_access_key_id=AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+            aws_session_token=AWS_SESSION_TOKEN,
+            config=Config(max_pool_connections=SCAN_WORKERS * UPLOAD_WORKERS * 2),
+        )
+        info('Conexión a S3 exitosa.')
+        return s3
+    except Exception as e:
+        critical(f'No fue posible conectarse a S3. Excepción: {e}')
+        exit_program(True)
+
+def conectar_dynamodb():
+    try:
+        client = boto3.client(
+            'dynamodb',
+            region_name=AWS_REGION,
+            aws_access_key_id=AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+            aws_session_token=AWS_SESSION_TOKEN,
+            config=Config(max_pool_connections=max(10, SCAN_WORKERS * 2)),
+        )
+        info('Conexión a DynamoDB exitosa.')
+        return client
+    except Exception as e:
+        critical(f'No fue posible conectarse a DynamoDB. Excepción: {e}')
+        exit_program(True)
+
+s3 = conectar_s3()
+client = conectar_dynamodb()
+
+def inicializar_proceso():
+    # Los clientes de boto3 no deben compartirse entre procesos.
+    global s3, client
+    s3 = conectar_s3()
+    client = conectar_dynamodb()
+
+def leer_json(uri):
+    try:
+        if uri.startswith('s3://'):
+            bucket, key = uri[len('s3://'):].split('/', 1)
+            return json.loads(s3.get_object(Bucket=bucket, Key=key)['Body'].read())
+        with open(uri, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, s3.exceptions.NoSuchKey):
+        return {}
+
+def guardar_json(uri, data):
+    body = json.dumps(data, ensure_ascii=False)
+    if uri.startswith('s3://'):
+        bucket, key = uri[len('s3://'):].split('/', 1)
+        s3.put_object(Bucket=bucket, Key=key, Body=body.encode('utf-8'))
+        return
+    os.makedirs(os.path.dirname(uri) or '.', exist_ok=True)
+    tmp_file = f"{uri}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, uri)
+
+def borrar_json(uri):
+    if uri.startswith('s3://'):
+        bucket, key = uri[len('s3://'):].split('/', 1)
+        s3.delete_object(Bucket=bucket, Key=key)
+    elif os.path.exists(uri):
+        os.remove(uri)
+
+def estado_run_uri(tabla):
+    return f"{tabla['scan_state_uri']}/run.json"
+
+def estado_segmento_uri(tabla, segment):
+    return f"{tabla['scan_state_uri']}/seg-{segment}.json"
+
+columnas_fuera_de_esquema = set()
+
+def a_tabla_arrow(tabla, products):
+    nombre = tabla['table_name']
+    esquema = ESQUEMAS.get(nombre)
+    if esquema is None:
+        return pa.Table.from_pandas(products, preserve_index=False)
+    extra = {(nombre, c) for c in products.columns if c not in esquema.names} - columnas_fuera_de_esquema
+    if extra:
+        warning(f"Columnas fuera del esquema de {nombre}, se omiten en la salida {tabla['output_format']}: "
+                f"{sorted(c for _, c in extra)}", nombre)
+        columnas_fuera_de_esquema.update(extra)
+    presentes = [n for n in esquema.names if n in products.columns]
+    arrow = pa.Table.from_pandas(products[presentes], schema=pa.schema([esquema.field(n) for n in presentes]),
+                                 preserve_index=False, safe=False)
+    for campo in esquema:
+        if campo.name not in presentes:
+            arrow = arrow.append_column(campo, pa.nulls(len(arrow), campo.type))
+    return arrow.select(esquema.names).replace_schema_metadata(None)
+
+def escribir_objeto(tabla, products):
+    # El objeto se serializa en memoria y solo pasa a disco si supera SPOOL_MAX_MB.
+    buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MB * 1024 * 1024)
+    if tabla['output_format'] == 'json':
+        buffer.write(products.to_json(orient='records', lines=True, force_ascii=False).encode('utf-8'))
+    elif tabla['output_format'] == 'parquet':
+        pq.write_table(a_tabla_arrow(tabla, products), buffer, row_group_size=tabla['row_group_rows'],
+                       compression=tabla['output_compression'], coerce_timestamps='ms',
+                       allow_truncated_timestamps=True)
+    else:
+        orc.write_table(a_tabla_arrow(tabla, products), buffer, compression=tabla['output_compression'])
+    buffer.seek(0, os.SEEK_END)
+    tamano = buffer.tell()
+    buffer.seek(0)
+    return buffer, tamano
+
+# Columna auxiliar con el digest de cada fila; va de transform a serialize
+# junto a las filas y no se escribe en los objetos.
+COLUMNA_HASH_FILA = '__hash_fila'
+
+def mezclar(valores):
+    # splitmix64 sobre un array uint64 (las multiplicaciones desbordan a propósito).
+    x = valores.astype('uint64')
+    with np.errstate(over='ignore'):
+        x += np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def constante(nombre):
+    return np.uint64(int.from_bytes(hashlib.blake2b(nombre.encode('utf-8'), digest_size=8).digest(), 'big'))
+
+def aporte(hashes, nombre):
+    # Un nulo (0) no aporta nada: una columna ausente y una nula dan lo mismo.
+    return np.where(hashes == 0, np.uint64(0), mezclar(hashes ^ constante(nombre)))
+
+def hash_numeros(valores):
+    # Los floats enteros se hashean como int64, así 3 y 3.0 (una columna entera
+    # que en otra página vino con nulos) dan lo mismo.
+    if valores.dtype.kind != 'f':
+        return valores.astype('int64').view('uint64')
+    enteros = np.isfinite(valores) & (np.floor(valores) == valores) & (np.abs(valores) < 2.0 ** 63)
+    bits = valores.view('uint64').copy()
+    bits[enteros] = valores[enteros].astype('int64').view('uint64')
+    return bits
+
+def hash_arrow(arr):
+    """Un uint64 por elemento de un array de pyarrow; los nulos valen 0.
+
+    Los structs suman el aporte de cada campo y las listas el de cada elemento
+    mezclado con su posición, con sumas acumuladas sobre los offsets, así que
+    los valores anidados también se hashean sin recorrerlos en Python.
+    """
+    if isinstance(arr, pa.ChunkedArray):
+        arr = arr.combine_chunks()
+    if pa.types.is_dictionary(arr.type):
+        arr = arr.dictionary_decode()
+    tipo = arr.type
+    if pa.types.is_null(tipo):
+        return np.zeros(len(arr), 'uint64')
+    if pa.types.is_struct(tipo):
+        suma = np.zeros(len(arr), 'uint64')
+        with np.errstate(over='ignore'):
+            for i in range(tipo.num_fields):
+                suma += aporte(hash_arrow(arr.field(i)), tipo.field(i).name)
+        hashes = mezclar(suma ^ constante('struct'))
+    elif pa.types.is_list(tipo) or pa.types.is_large_list(tipo):
+        offsets = arr.offsets.to_numpy()
+        elementos = hash_arrow(arr.values.slice(offsets[0], offsets[-1] - offsets[0]))
+        offsets = offsets - offsets[0]
+        largos = np.diff(offsets)
+        posiciones = np.arange(len(elementos), dtype='uint64') - np.repeat(offsets[:-1], largos).astype('uint64')
+        with np.errstate(over='ignore'):
+            elementos = mezclar(elementos + posiciones * np.uint64(0xD6E8FEB86659FD93))
+            acumulado = np.concatenate([np.zeros(1, 'uint64'), np.cumsum(elementos, dtype='uint64')])
+            suma = acumulado[offsets[1:]] - acumulado[offsets[:-1]]
+        hashes = mezclar(suma ^ largos.astype('uint64') ^ constante('lista'))
+    elif pa.types.is_string(tipo) or pa.types.is_large_string(tipo):
+        hashes = pd.util.hash_array(arr.fill_null('').to_numpy(zero_copy_only=False).astype(object))
+    elif pa.types.is_boolean(tipo):
+        hashes = arr.fill_null(False).to_numpy(zero_copy_only=False).astype('uint64') ^ constante('bool')
+    elif pa.types.is_integer(tipo) or pa.types.is_floating(tipo):
+        hashes = hash_numeros(arr.fill_null(0).to_numpy(zero_copy_only=False))
+    elif pa.types.is_timestamp(tipo):
+        # En nanosegundos, para que la resolución que infiera pandas no cambie el hash.
+        hashes = arr.cast(pa.timestamp('ns', tz=tipo.tz), safe=False).cast(pa.int64()).fill_null(0) \
+            .to_numpy().view('uint64')
+    else:
+        return hash_arrow(arr.cast(pa.string()))
+    # Se mezcla también el valor crudo para que un 0 no se confunda con un nulo.
+    hashes = mezclar(hashes)
+    if arr.null_count:
+        hashes = np.where(arr.is_null().to_numpy(zero_copy_only=False), np.uint64(0), hashes)
+    return hashes
+
+def hash_filas(products):
+    """Digest de 64 bits de cada fila de products, por columnas.
+
+    Cada celda aporta según su valor y el nombre de su columna y la fila suma
+    los aportes, así que el resultado no depende del orden de las columnas ni
+    de las columnas nulas que agrega el concat con otras páginas. Una columna
+    que pyarrow no puede tipar (valores de tipos mezclados) se hashea desde el
+    JSON de cada valor.
+    """
+    suma = np.zeros(len(products), 'uint64')
+    for columna in products.columns:
+        serie = products[columna]
+        try:
+            arr = pa.array(serie, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            arr = pa.array([None if not isinstance(v, (list, dict)) and pd.isna(v)
+                            else json.dumps(v, sort_keys=True, default=str) for v in serie], pa.string())
+        with np.errstate(over='ignore'):
+            suma += aporte(hash_arrow(arr), str(columna))
+    return mezclar(suma)
+
+def hash_contenido(buffer):
+    # sha256 del objeto serializado; deja el buffer al inicio para subirlo.
+    digest = hashlib.sha256()
+    for bloque in iter(lambda: buffer.read(1024 * 1024), b''):
+        digest.update(bloque)
+    buffer.seek(0)
+    return digest.hexdigest()
+
+def fecha_run(run):
+    # dt es la fecha UTC de la ingesta, tomada del run_id (YYYYmmddTHHMMSSZ).
+    run_id = run['run_id']
+    return f'{run_id[:4]}-{run_id[4:6]}-{run_id[6:8]}'
+
+def valor_particion(valor):
+    # Se escapa para la ruta; Athena lee la columna proyectada tal como quedó en la ruta.
+    if valor is None or (not isinstance(valor, (list, dict)) and pd.isna(valor)) or valor == '':
+        return HIVE_DEFAULT_PARTITION
+    return quote(str(valor), safe='')
+
+def dividir_en_particiones(tabla, run, products):
+    """Separa products según partition_by.
+
+    Devuelve una lista de (particion, DataFrame), donde particion es una tupla de
+    (columna, valor) en el orden de partition_by lista para formar la ruta Hive.
+    La columna dt no sale de los datos sino de la fecha del run. Las columnas de
+    partición se conservan también dentro del objeto.
+    """
+    columnas = [c for c in tabla['partition_by'] if c != 'dt']
+    presentes = [c for c in columnas if c in products.columns]
+
+    def particion(valores):
+        return tuple((c, fecha_run(run) if c == 'dt' else valor_particion(valores.get(c)))
+                     for c in tabla['partition_by'])
+
+    if not presentes:
+        return [(particion({}), products)]
+    grupos = []
+    for valores, grupo in products.groupby(presentes, dropna=False, sort=True):
+        valores = valores if isinstance(valores, tuple) else (valores,)
+        grupos.append((particion(dict(zip(presentes, valores))), grupo))
+    return grupos
+
+def aplanar(products, columnas):
+    # Cada columna anidada se expande en columnas {columna}_{campo} de primer nivel.
+    for columna in columnas:
+        if columna not in products.columns:
+            continue
+        valores = [v if isinstance(v, dict) else {} for v in products[columna]]
+        expandidas = pd.json_normalize(valores, sep='_').add_prefix(f'{columna}_')
+        expandidas.index = products.index
+        products = products.drop(columns=[columna]).join(expandidas)
+    return products
+
+METRICAS = Metricas()
+
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=MULTIPART_CHUNK_MB * 1024 * 1024,
+    multipart_chunksize=MULTIPART_CHUNK_MB * 1024 * 1024,
+    max_concurrency=UPLOAD_WORKERS,
+)
+
+FIN = object()
+
+class PipelineDetenido(Exception):
+    pass
+
+class Pipeline:
+    """Etapas concurrentes conectadas por colas acotadas.
+
+    Cada etapa consume su cola de entrada con uno o más hilos y publica en la
+    siguiente; una cola llena bloquea a la etapa anterior (backpressure). Si un
+    hilo falla, el pipeline se detiene y esperar() relanza la excepción.
+    """
+
+    def __init__(self, nombre, tabla):
+        self.nombre = nombre
+        self.tabla = tabla
+        self.colas = {}
+        self.muestras = {}
+        self.hilos = []
+        self.fallo = None
+        self.detenido = threading.Event()
+        self.terminado = threading.Event()
+
+    def cola(self, nombre, tamano=PIPELINE_QUEUE_SIZE):
+        self.colas[nombre] = queue.Queue(maxsize=tamano)
+        self.muestras[nombre] = []
+        return self.colas[nombre]
+
+    def poner(self, cola, elemento):
+        while not self.detenido.is_set():
+            try:
+                cola.put(elemento, timeout=0.5)
+                return
+            except queue.Full:
+                pass
+        raise PipelineDetenido()
+
+    def tomar(self, cola):
+        while not self.detenido.is_set():
+            try:
+                return cola.get(timeout=0.5)
+            except queue.Empty:
+                pass
+        raise PipelineDetenido()
+
+    def detener(self, excepcion):
+        if self.fallo is None:
+            self.fallo = excepcion
+        self.detenido.set()
+
+    def etapa(self, nombre, workers, funcion, entrada=None, salida=None, final=None):
+        # Sin cola de entrada la etapa es un productor: funcion() genera los elementos.
+        activos = [workers]
+        lock = threading.Lock()
+
+        def trabajar():
+            try:
+                if entrada is None:
+                    for resultado in funcion():
+                        self.poner(salida, resultado)
+                else:
+                    while True:
+                        elemento = self.tomar(entrada)
+                        if elemento is FIN:
+                            self.poner(entrada, FIN)
+                            break
+                        for resultado in funcion(elemento):
+                            self.poner(salida, resultado)
+                with lock:
+                    activos[0] -= 1
+                    ultimo = activos[0] == 0
+                if ultimo:
+                    for resultado in (final() if final else []):
+                        self.poner(salida, resultado)
+                    self.poner(salida, FIN)
+            except PipelineDetenido:
+                pass
+            except Exception as e:
+                error(f'{self.nombre}: error en la etapa {nombre}. Excepción: {e}', self.tabla)
+                self.detener(e)
+
+        for n in range(workers):
+            hilo = threading.Thread(target=trabajar, name=f'{nombre}-{n}', daemon=True)
+            hilo.start()
+            self.hilos.append(hilo)
+
+    def monitorear(self):
+        ultimo_reporte = time.monotonic()
+        while not self.terminado.wait(1):
+            for nombre, cola in self.colas.items():
+                self.muestras[nombre].append(cola.qsize())
+            if time.monotonic() - ultimo_reporte >= PIPELINE_METRICS_SECONDS:
+                ultimo_reporte = time.monotonic()
+                profundidades = ', '.join(f'{n}={c.qsize()}/{c.maxsize}' for n, c in self.colas.items())
+                info(f'{self.nombre}: profundidad de colas: {profundidades}', self.tabla)
+
+    def iniciar_monitor(self):
+        threading.Thread(target=self.monitorear, name='monitor', daemon=True).start()
+
+    def esperar(self):
+        self.terminado.set()
+        for hilo in self.hilos:
+            hilo.join()
+        promedios = ', '.join(
+            f'{n}={sum(m) / len(m):.1f}/{self.colas[n].maxsize}' for n, m in self.muestras.items() if m)
+        if promedios:
+            # Una cola llena de forma sostenida indica que la etapa que la consume es el cuello de botella.
+            info(f'{self.nombre}: profundidad media de colas: {promedios}', self.tabla)
+        if self.fallo is not None:
+            raise self.fallo
+
+ERRORES_THROTTLING = ('ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded')
+SCAN_LIMIT_INICIAL = 100
+
+class Gobernador:
+    """Token bucket de RCU por segundo compartido por los segmentos de una tabla.
+
+    Antes de cada scan se espera saldo y se reserva el costo estimado de la
+    página; después se corrige con las RCU que DynamoDB informa en
+    ConsumedCapacity. El saldo puede quedar negativo y las páginas siguientes
+    (de cualquier segmento) esperan a pagarlo, así que la concurrencia efectiva
+    de los segmentos se ajusta sola al presupuesto. Limit se calcula para que una
+    página cueste a lo sumo un segundo de presupuesto.
+    Ante throttling (reintentos de botocore o la excepción) la tasa se reduce a
+    la mitad y luego vuelve a crecer de a poco hasta el objetivo (AIMD).
+    """
+
+    def __init__(self, tabla, objetivo):
+        self.tabla = tabla
+        self.objetivo = objetivo
+        self.tasa = objetivo
+        self.tokens = objetivo
+        self.ultimo = time.monotonic()
+        self.rcu_por_item = None
+        self.lock = threading.Lock()
+
+    def recargar(self):
+        ahora = time.monotonic()
+        self.tokens = min(self.tasa, self.tokens + (ahora - self.ultimo) * self.tasa)
+        self.ultimo = ahora
+
+    def reservar(self):
+        """Espera saldo y devuelve (Limit, RCU reservadas) para la próxima página."""
+        while True:
+            with self.lock:
+                self.recargar()
+                if self.tokens > 0:
+                    if not self.rcu_por_item:
+                        return SCAN_LIMIT_INICIAL, 0
+                    limite = max(1, int(self.tasa / self.rcu_por_item))
+                    reservado = limite * self.rcu_por_item
+                    self.tokens -= reservado
+                    return limite, reservado
+                faltante = -self.tokens / self.tasa
+            time.sleep(max(faltante, 0.01))
+
+    def registrar(self, rcu, escaneados, reintentos, reservado=0):
+        with self.lock:
+            self.recargar()
+            self.tokens -= rcu - reservado
+            if escaneados:
+                por_item = rcu / escaneados
+                self.rcu_por_item = por_item if self.rcu_por_item is None else (self.rcu_por_item + por_item) / 2
+            if reintentos:
+                self.reducir()
+            else:
+                self.tasa = min(self.objetivo, self.tasa + self.objetivo * 0.05)
+
+    def reducir(self):
+        # Llamar con el lock tomado.
+        self.tasa = max(self.objetivo * 0.05, self.tasa / 2)
+        self.tokens = min(self.tokens, 0)
+
+    def throttle(self):
+        with self.lock:
+            self.reducir()
+        warning(f'Throttling de DynamoDB; la tasa de scan baja a {self.tasa:.1f} RCU/s.', self.tabla)
+
+gobernadores = {}
+gobernadores_lock = threading.Lock()
+
+def gobernador_de(tabla):
+    """Devuelve el Gobernador de la tabla, o None si no hay un límite de RCU.
+
+    El objetivo es scan_capacity_percent de la capacidad de lectura aprovisionada
+    (o del máximo on-demand, si está configurado), acotado por scan_max_rcu. La
+    capacidad se lee con DescribeTable solo si scan_capacity_percent no es 0; si
+    falla (por ejemplo, un rol sin dynamodb:DescribeTable) se avisa y queda solo
+    scan_max_rcu. Con SCAN_EXECUTOR=process cada proceso tiene su propio bucket
+    y el objetivo se reparte entre los procesos que pueden escanear la tabla a
+    la vez.
+    """
+    table_name = tabla['table_name']
+    with gobernadores_lock:
+        if table_name in gobernadores:
+            return gobernadores[table_name]
+        capacidad = None
+        if tabla['scan_capacity_percent']:
+            try:
+                descripcion = client.describe_table(TableName=table_name)['Table']
+                capacidad = descripcion.get('ProvisionedThroughput', {}).get('ReadCapacityUnits', 0) or \
+                    max(descripcion.get('OnDemandThroughput', {}).get('MaxReadRequestUnits', 0), 0)
+            except ClientError as e:
+                warning(f'No fue posible leer la capacidad de la tabla con DescribeTable ({e}); se ignora '
+                        f'scan_capacity_percent y el scan se limita solo con scan_max_rcu.', table_name)
+        objetivos = [capacidad * tabla['scan_capacity_percent'] / 100] if capacidad else []
+        if tabla['scan_max_rcu']:
+            objetivos.append(tabla['scan_max_rcu'])
+        gobernador = None
+        if objetivos:
+            objetivo = min(objetivos)
+            if SCAN_EXECUTOR == 'process':
+                objetivo /= min(SCAN_WORKERS, tabla['scan_segments'])
+            gobernador = Gobernador(table_name, objetivo)
+            leida = 'desconocida' if capacidad is None else capacidad or 'on-demand'
+            info(f'Scan limitado a {objetivo:.1f} RCU/s (capacidad de lectura: {leida}).', table_name)
+        gobernadores[table_name] = gobernador
+        return gobernador
+
+def valor_watermark(attribute_value):
+    if 'N' in attribute_value:
+        return Decimal(attribute_value['N'])
+    return attribute_value.get('S')
+
+def max_watermark(actual, candidato):
+    if candidato is None:
+        return actual
+    if actual is None or valor_watermark(candidato) > valor_watermark(actual):
+        return candidato
+    return actual
+
+def listar_objetos(bucket_name, prefijo):
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket_name, Prefix=prefijo):
+        yield from page.get('Contents', [])
+
+def borrar_objetos(bucket_name, keys):
+    for inicio in range(0, len(keys), 1000):
+        s3.delete_objects(Bucket=bucket_name, Delete={
+            'Objects': [{'Key': key} for key in keys[inicio:inicio + 1000]],
+            'Quiet': True,
+        })
+
+def borrar_partes_pendientes(tabla, run, segment, desde):
+    # Al reanudar, los lotes se vuelven a armar desde el checkpoint y pueden no
+    # caer en las mismas particiones que el intento anterior; se borra lo que ese
+    # intento haya subido después del último objeto confirmado.
+    prefijo = f"part-{run['run_id']}-{segment}-"
+    pendientes = []
+    for objeto in listar_objetos(tabla['bucket_name'], f"{tabla['table_name']}/"):
+        nombre = objeto['Key'].rpartition('/')[2]
+        if nombre.startswith(prefijo) and int(nombre[len(prefijo):].partition('.')[0]) >= desde:
+            pendientes.append(objeto['Key'])
+    if pendientes:
+        borrar_objetos(tabla['bucket_name'], pendientes)
+        info(f'Segmento {segment + 1}: se borraron {len(pendientes)} objetos sin confirmar del intento anterior.',
+             tabla['table_name'])
+
+def s3_key(tabla, run, segment, i, particion=()):
+    table_name = tabla['table_name']
+    extension = EXTENSIONES[tabla['output_format']]
+    if tabla['partition_by']:
+        # El run y el segmento van en el nombre para que ninguna ejecución pise
+        # los objetos de otra dentro de la misma partición.
+        directorio = "/".join([table_name] + [f'{c}={v}' for c, v in particion])
+        return f"{directorio}/part-{run['run_id']}-{segment}-{i}.{extension}"
+    partes = [table_name]
+    if tabla['incremental_column']:
+        partes.append(f"run={run['run_id']}")
+    if tabla['scan_segments'] > 1:
+        partes.append(f"seg={segment}")
+    if len(partes) == 1:
+        return f"{table_name}/{table_name}-data-{i}.{extension}"
+    return "/".join(partes + [f"part-{i}.{extension}"])
+
+def ranura(tabla, run, segment, i, particion=()):
+    # Identifica un objeto entre ejecuciones: la partición sin dt, el segmento y
+    # el número de objeto. Sin partition_by la clave ya es estable en modo completo.
+    if not tabla['partition_by']:
+        return s3_key(tabla, run, segment, i)
+    return "/".join([f'{c}={v}' for c, v in particion if c != 'dt'] + [f'{segment}-{i}'])
+
+def procesar_segmento(tabla, segment, run, estado):
+    table_name = tabla['table_name']
+    total_segments = tabla['scan_segments']
+    incremental_column = tabla['incremental_column']
+    nombre_segmento = f'Segmento {segment + 1}/{total_segments}'
+    if estado.get('done'):
+        info(f"{nombre_segmento} ya completado en una ejecución previa; se omite.", table_name)
+        return {
+            'table_name': table_name,
+            'segment': segment,
+            'paginas': estado['paginas'],
+            'registros': estado['registros'],
+            'fallos': 0,
+            'watermark': estado.get('watermark'),
+            'objetos': estado.get('objetos', {}),
+        }
+
+    gobernador = gobernador_de(tabla)
+    # En JSON no se aplica el esquema para no descartar atributos anidados que no declara.
+    esquema = ESQUEMAS.get(table_name) if tabla['output_format'] != 'json' else None
+
+    operation_parameters = {
+        'TableName': table_name,
+        'ReturnConsumedCapacity': 'TOTAL',
+    }
+    if total_segments > 1:
+        operation_parameters['Segment'] = segment
+        operation_parameters['TotalSegments'] = total_segments
+    if run['watermark'] is not None:
+        operation_parameters['FilterExpression'] = '#wm > :wm'
+        operation_parameters['ExpressionAttributeNames'] = {'#wm': incremental_column}
+        operation_parameters['ExpressionAttributeValues'] = {':wm': run['watermark']}
+    if estado.get('last_key'):
+        operation_parameters['ExclusiveStartKey'] = estado['last_key']
+        info(f"{nombre_segmento}: reanudando desde el objeto {estado['part']}.", table_name)
+    i = estado.get('part', 0)
+    if tabla['partition_by'] and run.get('reanudado'):
+        borrar_partes_pendientes(tabla, run, segment, i)
+    paginas = estado.get('paginas', 0)
+    registros = estado.get('registros', 0)
+    fallos = 0
+    watermark = estado.get('watermark')
+    objetos = dict(estado.get('objetos', {}))
+    anteriores = run.get('anteriores', {})
+
+    # Cada segmento acumula sus propias métricas y las devuelve en el resultado,
+    # porque con SCAN_EXECUTOR=process corre en otro proceso.
+    metricas = Metricas()
+    pipeline = Pipeline(nombre_segmento, table_name)
+    cola_scan = pipeline.cola('scan')
+    cola_transform = pipeline.cola('transform')
+    cola_lotes = pipeline.cola('lotes', PIPELINE_BATCH_QUEUE_SIZE)
+    cola_serialize = pipeline.cola('serialize', PIPELINE_BATCH_QUEUE_SIZE)
+    cola_upload = pipeline.cola('upload')
+
+    def escanear():
+        # Se pagina a mano para fijar Limit en cada página según el gobernador y
+        # para reintentar la misma página si DynamoDB sigue limitando después de
+        # los reintentos de botocore.
+        parametros = dict(operation_parameters)
+        seq = 0
+        espera = 1
+        while True:
+            if gobernador:
+                parametros['Limit'], reservado = gobernador.reservar()
+            try:
+                with metricas.medir('etapa', tabla=table_name, etapa='scan'):
+                    page = client.scan(**parametros)
+            except ClientError as e:
+                if e.response['Error']['Code'] not in ERRORES_THROTTLING:
+                    raise
+                metricas.sumar('throttles', tabla=table_name)
+                if gobernador:
+                    gobernador.registrar(0, 0, 0, reservado)
+                    gobernador.throttle()
+                else:
+                    warning(f'{nombre_segmento}: throttling de DynamoDB; se reintenta en {espera} s.', table_name)
+                    time.sleep(espera)
+                    espera = min(espera * 2, 30)
+                continue
+            espera = 1
+            bytes_pagina = int(page['ResponseMetadata']['HTTPHeaders'].get('content-length', 0))
+            rcu = page.get('ConsumedCapacity', {}).get('CapacityUnits', 0)
+            reintentos = page['ResponseMetadata'].get('RetryAttempts', 0)
+            if gobernador:
+                gobernador.registrar(rcu, page.get('ScannedCount', 0), reintentos, reservado)
+            metricas.sumar('paginas', tabla=table_name)
+            metricas.sumar('registros', len(page['Items']), tabla=table_name)
+            metricas.sumar('bytes_leidos', bytes_pagina, tabla=table_name)
+            metricas.sumar('rcu', rcu, tabla=table_name)
+            metricas.sumar('reintentos', reintentos, tabla=table_name)
+            last_key = page.get('LastEvaluatedKey')
+            if page['Items']:
+                yield seq, page['Items'], last_key, bytes_pagina
+                seq += 1
+            if not last_key:
+                break
+            parametros['ExclusiveStartKey'] = last_key
+
+    def transformar(elemento):
+        seq, items, last_key, bytes_pagina = elemento
+        watermark_pagina = None
+        if incremental_column:
+            for item in items:
+                watermark_pagina = max_watermark(watermark_pagina, item.get(incremental_column))
+
+        with metricas.medir('etapa', tabla=table_name, etapa='deserializar'):
+            products = pd.DataFrame(items_a_columnas(items, esquema))
+
+            for columna in tabla['datetime_columns']:
+                if columna in products.columns:
+                    products[columna] = pd.to_datetime(products[columna], errors='coerce')
+
+        with metricas.medir('etapa', tabla=table_name, etapa='aplanar'):
+            products = aplanar(products, tabla['flatten'])
+
+        with metricas.medir('etapa', tabla=table_name, etapa='hash_filas'):
+            products[COLUMNA_HASH_FILA] = hash_filas(products)
+
+        # Los bytes de la página se reparten entre sus particiones según las filas.
+        grupos = [(particion, grupo, bytes_pagina * len(grupo) / len(products))
+                  for particion, grupo in dividir_en_particiones(tabla, run, products)]
+        yield seq, grupos, last_key, watermark_pagina
+
+    # Las páginas transformadas llegan desordenadas; el agrupador las reordena y
+    # acumula las filas de cada partición por separado hasta target_object_mb o
+    # target_object_rows, así que con muchos tenants los objetos no se achican.
+    # El tamaño se estima con los bytes de las respuestas de DynamoDB por la
+    # razón serializado/crudo observada en los objetos anteriores, que
+    # actualizan los hilos de serialize bajo lock_razon. El checkpoint solo
+    # avanza cuando no queda ninguna partición con filas pendientes; para
+    # acotar la memoria y no postergarlo sin límite, al juntar BATCH_MAX_MB
+    # entre todas las particiones se cierran todas (un corte).
+    lote = {'siguiente': 0, 'espera': {}, 'particiones': {}, 'bytes': 0, 'paginas': 0, 'last_key': None,
+            'watermark': None, 'part': i, 'razon': 1.0}
+    lock_razon = threading.Lock()
+
+    def cerrar_particion(particion):
+        pendiente = lote['particiones'].pop(particion)
+        lote['bytes'] -= pendiente['bytes']
+        checkpoint = None
+        if not lote['particiones']:
+            # Todo lo escaneado hasta last_key quedó en este objeto o en los anteriores.
+            checkpoint = {
+                'part': lote['part'] + 1,
+                'paginas': lote['paginas'],
+                'last_key': lote['last_key'],
+                'watermark': lote['watermark'],
+            }
+            lote.update(paginas=0, watermark=None)
+        resultado = (lote['part'], particion, pendiente['frames'], pendiente['bytes'], checkpoint)
+        lote['part'] += 1
+        return resultado
+
+    def particion_completa(pendiente):
+        if tabla['target_object_rows'] and pendiente['filas'] >= tabla['target_object_rows']:
+            return True
+        with lock_razon:
+            razon = lote['razon']
+        return pendiente['bytes'] * razon >= tabla['target_object_mb'] * 1024 * 1024
+
+    def agrupar(elemento):
+        lote['espera'][elemento[0]] = elemento
+        while lote['siguiente'] in lote['espera']:
+            _, grupos, last_key, watermark_pagina = lote['espera'].pop(lote['siguiente'])
+            lote['siguiente'] += 1
+            lote['paginas'] += 1
+            lote['last_key'] = last_key
+            lote['watermark'] = max_watermark(lote['watermark'], watermark_pagina)
+            # Primero se reparte la página entera: un objeto que se cierra a la
+            # mitad podría llevar un checkpoint que saltee el resto de la página.
+            for particion, grupo, bytes_grupo in grupos:
+                pendiente = lote['particiones'].setdefault(particion, {'frames': [], 'filas': 0, 'bytes': 0})
+                pendiente['frames'].append(grupo)
+                pendiente['filas'] += len(grupo)
+                pendiente['bytes'] += bytes_grupo
+                lote['bytes'] += bytes_grupo
+            if lote['bytes'] >= BATCH_MAX_MB * 1024 * 1024:
+                for particion in list(lote['particiones']):
+                    yield cerrar_particion(particion)
+                continue
+            for particion, _, _ in grupos:
+                if particion_completa(lote['particiones'][particion]):
+                    yield cerrar_particion(particion)
+
+    def agrupar_final():
+        for particion in list(lote['particiones']):
+            yield cerrar_particion(particion)
+
+    def serializar(elemento):
+        part, particion, frames, bytes_crudos, checkpoint = elemento
+        with metricas.medir('etapa', tabla=table_name, etapa='serializar'):
+            products = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+            hashes_filas = products.pop(COLUMNA_HASH_FILA)
+            buffer, tamano = escribir_objeto(tabla, products)
+            # La suma (módulo 2**64) de los digests de las filas no depende
+            # de cómo se repartieron las filas entre objetos.
+            suma = int(hashes_filas.to_numpy().sum(dtype='uint64'))
+            filas = {'filas': len(products), 'suma_filas': f'{suma:016x}'}
+            hash_objeto = hash_contenido(buffer)
+        metricas.sumar('objetos', tabla=table_name)
+        metricas.sumar('bytes_escritos', tamano, tabla=table_name)
+        if bytes_crudos:
+            with lock_razon:
+                lote['razon'] = (lote['razon'] + tamano / bytes_crudos) / 2
+        yield part, particion, buffer, tamano, hash_objeto, filas, checkpoint
+
+    def subir(elemento):
+        # Si la ranura ya tenía un objeto con el mismo hash en el manifiesto
+        # anterior, se conserva ese objeto y no se sube nada.
+        part, particion, buffer, tamano, hash_objeto, filas, checkpoint = elemento
+        slot = ranura(tabla, run, segment, part, particion)
+        anterior = anteriores.get(slot)
+        if anterior and anterior['hash'] == hash_objeto:
+            buffer.close()
+            metricas.sumar('objetos_sin_cambios', tabla=table_name)
+            info(f"Sin cambios, se conserva: {anterior['key']}", table_name)
+            yield part, True, checkpoint, {anterior['key']: {'hash': hash_objeto, 'bytes': tamano, 'ranura': slot,
+                                                             **filas}}, filas['filas']
+            return
+        s3_products_path = s3_key(tabla, run, segment, part, particion)
+        try:
+            with buffer, metricas.medir('etapa', tabla=table_name, etapa='subir'):
+                s3.upload_fileobj(buffer, tabla['bucket_name'], s3_products_path, Config=TRANSFER_CONFIG)
+            info(f'Subido: {s3_products_path}', table_name)
+            subido = {s3_products_path: {'hash': hash_objeto, 'bytes': tamano, 'ranura': slot, **filas}}
+            yield part, True, checkpoint, subido, filas['filas']
+        except Exception as e:
+            error(f'Error al subir productos a S3. Excepción: {str(e)}', table_name)
+            metricas.sumar('fallos_subida', tabla=table_name)
+            yield part, False, checkpoint, {}, filas['filas']
+
+    pipeline.etapa('scan', 1, escanear, salida=cola_scan)
+    pipeline.etapa('transform', TRANSFORM_WORKERS, transformar, cola_scan, cola_transform)
+    pipeline.etapa('lotes', 1, agrupar, cola_transform, cola_lotes, final=agrupar_final)
+    pipeline.etapa('serialize', SERIALIZE_WORKERS, serializar, cola_lotes, cola_serialize)
+    pipeline.etapa('upload', UPLOAD_WORKERS, subir, cola_serialize, cola_upload)
+    pipeline.iniciar_monitor()
+
+    # Las confirmaciones se aplican en orden de objeto para que el checkpoint
+    # nunca salte un objeto que todavía no llegó a S3.
+    confirmados = {}
+    try:
+        while True:
+            elemento = pipeline.tomar(cola_upload)
+            if elemento is FIN:
+                break
+            confirmados[elemento[0]] = elemento
+            while i in confirmados:
+                _, ok, checkpoint, subidos, filas = confirmados.pop(i)
+                i += 1
+                objetos.update(subidos)
+                registros += filas
+                if not ok:
+                    fallos += 1
+                if checkpoint is None:
+                    continue
+                paginas += checkpoint['paginas']
+                watermark = max_watermark(watermark, checkpoint['watermark'])
+                # Solo se avanza el checkpoint mientras no haya fallos, para que --resume
+                # vuelva a procesar desde el primer objeto que no llegó a S3. El
+                # último lote (sin last_key) marca el segmento como terminado en
+                # la misma escritura, para que --resume no lo vuelva a escanear.
+                if not fallos:
+                    with metricas.medir('etapa', tabla=table_name, etapa='checkpoint'):
+                        guardar_json(estado_segmento_uri(tabla, segment), dict(
+                            checkpoint, paginas=paginas, registros=registros, watermark=watermark, objetos=objetos,
+                            done=checkpoint['last_key'] is None))
+                info(f'{nombre_segmento}: {paginas} páginas, {registros} registros.', table_name)
+    except PipelineDetenido:
+        pass
+    except Exception as e:
+        pipeline.detener(e)
+    pipeline.esperar()
+    if gobernador:
+        metricas.fijar('tasa_rcu', round(gobernador.tasa, 1), tabla=table_name)
+
+    # Si la última página vino vacía, el último lote todavía tenía last_key.
+    if not fallos:
+        guardar_json(estado_segmento_uri(tabla, segment), {
+            'part': i,
+            'paginas': paginas,
+            'last_key': None,
+            'registros': registros,
+            'watermark': watermark,
+            'objetos': objetos,
+            'done': True,
+        })
+
+    return {
+        'table_name': table_name,
+        'segment': segment,
+        'paginas': paginas,
+        'registros': registros,
+        'fallos': fallos,
+        'watermark': watermark,
+        'objetos': objetos,
+        'metricas': metricas.exportar(),
+    }
+
+def ejecutar_tablas(trabajos):
+    """Escanea los segmentos de todas las tablas con un presupuesto global de SCAN_WORKERS.
+
+    trabajos es una lista de (tabla, run, estados). Cada tabla se cierra
+    (checkpoint incremental y limpieza del estado de escaneo) en cuanto terminan
+    todos sus segmentos. Una tabla falla si algún segmento lanzó una excepción
+    o no pudo subir alguno de sus objetos. Devuelve los nombres de las tablas
+    que fallaron.
+    """
+    if SCAN_EXECUTOR == 'process':
+        executor = ProcessPoolExecutor(max_workers=SCAN_WORKERS, initializer=inicializar_proceso)
+    else:
+        executor = ThreadPoolExecutor(max_workers=SCAN_WORKERS)
+
+    pendientes = {tabla['table_name']: tabla['scan_segments'] for tabla, _, _ in trabajos}
+    resultados = {tabla['table_name']: [] for tabla, _, _ in trabajos}
+    fallidas = set()
+    inicio = time.perf_counter()
+    with executor:
+        futures = {}
+        # Se intercalan los segmentos de las tablas para que ninguna espere a que otra termine.
+        for segment in range(max(tabla['scan_segments'] for tabla, _, _ in trabajos)):
+            for tabla, run, estados in trabajos:
+                if segment < tabla['scan_segments']:
+                    future = executor.submit(procesar_segmento, tabla, segment, run, estados[segment])
+                    futures[future] = (tabla, run, segment)
+        for future in as_completed(futures):
+            tabla, run, segment = futures[future]
+            table_name = tabla['table_name']
+            try:
+                resultado = future.result()
+                info(f"Segmento {segment + 1}/{tabla['scan_segments']} completado: "
+                     f"{resultado['paginas']} páginas, {resultado['registros']} registros.", table_name)
+                resultados[table_name].append(resultado)
+                if resultado.get('metricas'):
+                    METRICAS.fusionar(resultado['metricas'])
+            except Exception as e:
+                error(f"Error procesando el segmento {segment + 1}/{tabla['scan_segments']}. Excepción: {e}", table_name)
+                fallidas.add(table_name)
+            pendientes[table_name] -= 1
+            if pendientes[table_name] == 0:
+                fallos = sum(r['fallos'] for r in resultados[table_name])
+                if fallos:
+                    error(f'{fallos} objetos no se pudieron subir a S3; la exportación quedó incompleta.', table_name)
+                    fallidas.add(table_name)
+                with METRICAS.medir('etapa', tabla=table_name, etapa='finalizar'):
+                    finalizar_tabla(tabla, run, resultados[table_name], table_name not in fallidas)
+                METRICAS.observar('tabla', time.perf_counter() - inicio, tabla=table_name)
+                METRICAS.fijar('tabla_completada', int(table_name not in fallidas), tabla=table_name)
+    return fallidas
+
+def guardar_metricas(inicio, tablas, fallidas):
+    METRICAS.fijar('ultima_ejecucion_timestamp_seconds', int(inicio))
+    METRICAS.fijar('ultima_ejecucion_exitosa', int(not fallidas))
+    try:
+        METRICAS.guardar('ingesta', METRICS_JSON_PATH, METRICS_PROM_PATH, METRICS_PUSHGATEWAY_URL,
+                         inicio=datetime.fromtimestamp(inicio, timezone.utc).isoformat(),
+                         segundos=round(time.time() - inicio, 3),
+                         tablas=[tabla['table_name'] for tabla in tablas], fallidas=sorted(fallidas))
+        info(f'Métricas guardadas en {METRICS_JSON_PATH}.')
+    except Exception as e:
+        warning(f'No fue posible guardar las métricas. Excepción: {e}')
+
+def finalizar_tabla(tabla, run, resultados, completa):
+    table_name = tabla['table_name']
+    if not completa:
+        critical(f"La tabla no se completó; se conserva el estado en {tabla['scan_state_uri']} para usar --resume.",
+                 table_name)
+        return
+    if tabla['incremental_column']:
+        actualizar_checkpoint(tabla, run, resultados)
+    # El manifiesto se guarda antes de borrar la foto anterior: si el proceso
+    # se corta en el medio quedan objetos de más, nunca un manifiesto que
+    # apunte a objetos borrados.
+    anterior = leer_json(tabla['manifest_uri'])
+    manifiesto = actualizar_manifiesto(tabla, run, resultados, anterior)
+    avisar_particiones_nuevas(tabla, anterior, manifiesto)
+    if manifiesto.get('retirados'):
+        retirar_snapshots_anteriores(tabla, manifiesto)
+    limpiar_estado_scan(tabla, resultados)
+    paginas = sum(r['paginas'] for r in resultados)
+    registros = sum(r['registros'] for r in resultados)
+    info(f'Tabla completada. Páginas procesadas: {paginas}, registros: {registros}', table_name)
+
+def avisar_particiones_nuevas(tabla, anterior, manifiesto):
+    # La proyección enum de generar_ddl solo incluye los valores que existían
+    # al generar el DDL.
+    if not anterior:
+        return
+    for columna in tabla['partition_by']:
+        if columna == 'dt':
+            continue
+        nuevos = valores_de_particion(manifiesto['objetos'], columna) - \
+            valores_de_particion(anterior.get('objetos', {}), columna)
+        if nuevos:
+            warning(f'Valores nuevos de {columna}: {sorted(nuevos)}. Athena no ve sus particiones hasta ejecutar '
+                    f'el ALTER TABLE que imprime --ddl.', tabla['table_name'])
+
+def hash_de_hashes(hashes):
+    return hashlib.sha256('\n'.join(sorted(hashes)).encode('utf-8')).hexdigest()
+
+def hash_de_filas(tabla, objetos):
+    """Hash del conjunto de filas de los objetos, sin importar en qué objeto quedó cada una.
+
+    Suma los suma_filas de los objetos y le agrega la cantidad de filas y la
+    configuración que da forma a la salida. Los objetos de manifiestos
+    anteriores a suma_filas solo tienen el hash de su contenido; mientras
+    quede alguno, se usa hash_de_hashes.
+    """
+    if any('suma_filas' not in objeto for objeto in objetos):
+        return hash_de_hashes(objeto['hash'] for objeto in objetos)
+    suma = sum(int(objeto['suma_filas'], 16) for objeto in objetos) % 2 ** 64
+    filas = sum(objeto['filas'] for objeto in objetos)
+    forma = json.dumps([tabla['output_format'], tabla['flatten'], tabla['partition_by']])
+    return hashlib.sha256(f'{forma}\n{filas}\n{suma:016x}'.encode('utf-8')).hexdigest()
+
+def manifiesto_de(tabla, run_id, objetos):
+    """Arma el manifiesto de contenido de la tabla a partir de sus objetos.
+
+    objetos es {key: {'hash', 'bytes', 'ranura', 'filas', 'suma_filas'}}. El
+    hash de cada partición y el de la tabla dependen solo de las filas (no de
+    las claves de los objetos ni de dónde se cortó cada objeto), así que una
+    ingesta que no encuentra cambios produce el mismo hash y el ETL puede
+    omitir la recarga.
+    """
+    particiones = {}
+    for key, objeto in objetos.items():
+        particiones.setdefault(key.rpartition('/')[0], []).append(objeto)
+    return {
+        'table': tabla['table_name'],
+        'run_id': run_id,
+        'hash': hash_de_filas(tabla, objetos.values()),
+        'particiones': {directorio: hash_de_filas(tabla, objetos_particion)
+                        for directorio, objetos_particion in sorted(particiones.items())},
+        'objetos': objetos,
+    }
+
+def actualizar_manifiesto(tabla, run, resultados, anterior):
+    # En modo incremental los objetos de ejecuciones anteriores siguen siendo
+    # parte de la tabla; en modo completo la tabla es solo la foto de este run
+    # y los objetos del manifiesto anterior que ya no están quedan en retirados
+    # hasta que retirar_snapshots_anteriores los borre.
+    objetos = {}
+    if tabla['incremental_column']:
+        objetos.update(anterior.get('objetos', {}))
+    for resultado in resultados:
+        objetos.update(resultado.get('objetos', {}))
+    manifiesto = manifiesto_de(tabla, run['run_id'], objetos)
+    if not tabla['incremental_column']:
+        retirados = (set(anterior.get('objetos', {})) | set(anterior.get('retirados', []))) - set(objetos)
+        if retirados:
+            manifiesto['retirados'] = sorted(retirados)
+    guardar_json(tabla['manifest_uri'], manifiesto)
+    info(f"Manifiesto actualizado en {tabla['manifest_uri']}: {len(objetos)} objetos, hash {manifiesto['hash'][:12]}.",
+         tabla['table_name'])
+    return manifiesto
+
+def objetos_reutilizables(tabla):
+    # Solo en modo completo se reemplaza la foto entera y tiene sentido
+    # conservar los objetos anteriores que no cambiaron.
+    if tabla['incremental_column']:
+        return {}
+    objetos = leer_json(tabla['manifest_uri']).get('objetos', {})
+    return {objeto['ranura']: {'key': key, 'hash': objeto['hash']}
+            for key, objeto in objetos.items() if objeto.get('ranura')}
+
+def retirar_snapshots_anteriores(tabla, manifiesto):
+    # En modo completo cada run es una foto entera de la tabla; con claves por run
+    # las fotos anteriores quedarían en otras particiones dt y se contarían dos
+    # veces. Solo se borran los objetos que listaba el manifiesto anterior (o que
+    # un run cortado dejó en retirados): lo demás bajo el prefijo, como otros
+    # formatos, backfills manuales o la salida parcial de otro run, no es de
+    # esta ingesta. Los objetos reutilizados siguen en el manifiesto nuevo.
+    retirados = manifiesto.pop('retirados')
+    borrar_objetos(tabla['bucket_name'], retirados)
+    guardar_json(tabla['manifest_uri'], manifiesto)
+    info(f'Se borraron {len(retirados)} objetos de ingestas completas anteriores.', tabla['table_name'])
+
+def compactar(tabla, prefijo):
+    """Une los objetos menores a target_object_mb de cada partición bajo prefijo.
+
+    Los objetos se agrupan por directorio y extensión; cada grupo se escribe como
+    un objeto compacted-{run}-{n} y solo después se borran los originales, así que
+    un fallo a mitad de camino deja datos duplicados pero nunca perdidos. No debe
+    ejecutarse en paralelo con una ingesta sobre el mismo prefijo. Si la tabla
+    tiene manifiesto, se actualiza antes de borrar cada lote; el objeto compactado
+    no tiene ranura y la siguiente ingesta completa lo reemplaza y lo borra. Sin
+    manifiesto, la ingesta completa no lo borra, así que solo conviene en
+    particiones que no se reescriben (run=... en modo incremental).
+    """
+    table_name = tabla['table_name']
+    bucket_name = tabla['bucket_name']
+    objetivo = tabla['target_object_mb'] * 1024 * 1024
+    manifiesto = leer_json(tabla['manifest_uri'])
+    grupos = {}
+    for objeto in listar_objetos(bucket_name, prefijo):
+        directorio, _, nombre = objeto['Key'].rpartition('/')
+        extension = nombre.rpartition('.')[2]
+        if extension in EXTENSIONES.values() and objeto['Size'] < objetivo:
+            grupos.setdefault((directorio, extension), []).append(objeto)
+
+    run_id = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    creados = 0
+    eliminados = 0
+    for (directorio, extension), objetos in sorted(grupos.items()):
+        lotes, actual, tamano = [], [], 0
+        for objeto in sorted(objetos, key=lambda o: o['Key']):
+            if actual and tamano + objeto['Size'] > objetivo:
+                lotes.append(actual)
+                actual, tamano = [], 0
+            actual.append(objeto)
+            tamano += objeto['Size']
+        lotes.append(actual)
+
+        for lote in lotes:
+            if len(lote) < 2:
+                continue
+            buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MB * 1024 * 1024)
+            if extension == 'json':
+                # JSON lines se concatena sin parsear.
+                for objeto in lote:
+                    contenido = s3.get_object(Bucket=bucket_name, Key=objeto['Key'])['Body'].read()
+                    buffer.write(contenido)
+                    if contenido and not contenido.endswith(b'\n'):
+                        buffer.write(b'\n')
+            else:
+                tablas = []
+                for objeto in lote:
+                    contenido = pa.BufferReader(s3.get_object(Bucket=bucket_name, Key=objeto['Key'])['Body'].read())
+                    tablas.append(pq.read_table(contenido) if extension == 'parquet' else orc.read_table(contenido))
+                arrow = pa.concat_tables(tablas, promote_options='default')
+                if extension == 'parquet':
+                    pq.write_table(arrow, buffer, row_group_size=tabla['row_group_rows'],
+                                   compression=tabla['output_compression'])
+                else:
+                    orc.write_table(arrow, buffer, compression=tabla['output_compression'])
+            bytes_destino = buffer.tell()
+            buffer.seek(0)
+            hash_destino = hash_contenido(buffer)
+            destino = f"{directorio}/compacted-{run_id}-{creados}.{extension}"
+            with buffer:
+                s3.upload_fileobj(buffer, bucket_name, destino, Config=TRANSFER_CONFIG)
+            if manifiesto:
+                reemplazados = {objeto['Key'] for objeto in lote}
+                objetos_manifiesto = {key: objeto for key, objeto in manifiesto['objetos'].items()
+                                      if key not in reemplazados}
+                objetos_manifiesto[destino] = {'hash': hash_destino, 'bytes': bytes_destino, 'ranura': None}
+                # El objeto compactado tiene las mismas filas que los que reemplaza.
+                originales = [manifiesto['objetos'][key] for key in reemplazados if key in manifiesto['objetos']]
+                if len(originales) == len(lote) and all('suma_filas' in objeto for objeto in originales):
+                    suma = sum(int(objeto['suma_filas'], 16) for objeto in originales) % 2 ** 64
+                    objetos_manifiesto[destino].update(filas=sum(objeto['filas'] for objeto in originales),
+                                                       suma_filas=f'{suma:016x}')
+                retirados = manifiesto.get('retirados')
+                manifiesto = manifiesto_de(tabla, manifiesto['run_id'], objetos_manifiesto)
+                if retirados:
+                    manifiesto['retirados'] = retirados
+                guardar_json(tabla['manifest_uri'], manifiesto)
+            borrar_objetos(bucket_name, [objeto['Key'] for objeto in lote])
+            info(f'Compactado: {len(lote)} objetos en {destino}', table_name)
+            creados += 1
+            eliminados += len(lote)
+    info(f'Compactación terminada: {eliminados} objetos reemplazados por {creados}.', table_name)
+
+def tipo_hive(tipo, formato):
+    if pa.types.is_struct(tipo):
+        return 'struct<' + ','.join(f'{campo.name}:{tipo_hive(campo.type, formato)}' for campo in tipo) + '>'
+    if pa.types.is_list(tipo):
+        return f'array<{tipo_hive(tipo.value_type, formato)}>'
+    if pa.types.is_timestamp(tipo):
+        # to_json escribe las fechas como milisegundos desde epoch.
+        return 'bigint' if formato == 'json' else 'timestamp'
+    if pa.types.is_boolean(tipo):
+        return 'boolean'
+    if pa.types.is_integer(tipo):
+        return 'bigint'
+    if pa.types.is_floating(tipo):
+        return 'double'
+    return 'string'
+
+def particiones_existentes(tabla):
+    valores = {columna: set() for columna in tabla['partition_by']}
+    for objeto in listar_objetos(tabla['bucket_name'], f"{tabla['table_name']}/"):
+        for directorio in objeto['Key'].split('/')[1:-1]:
+            columna, igual, valor = directorio.partition('=')
+            if igual and columna in valores:
+                valores[columna].add(valor)
+    return valores
+
+def generar_ddl(tabla):
+    """Devuelve el DDL de Athena para la salida de la tabla.
+
+    Las columnas salen de esquemas.py y las particiones se resuelven con
+    partition projection, sin MSCK REPAIR ni crawlers: dt como rango de fechas
+    hasta NOW y el resto como enum con los valores que ya existen en S3 (injected
+    obligaría a filtrar cada columna por igualdad, y las consultas del ETL leen
+    todos los tenants). El CREATE EXTERNAL TABLE IF NOT EXISTS no modifica una
+    tabla que ya existe, así que le sigue un ALTER TABLE ... SET TBLPROPERTIES
+    con los valores actuales: Athena no ve las particiones de un tenant nuevo
+    hasta que se ejecuta. La ingesta avisa cuando aparece uno.
+    """
+    table_name = tabla['table_name']
+    esquema = ESQUEMAS.get(table_name)
+    if esquema is None:
+        warning('La tabla no tiene esquema en esquemas.py; no se genera el DDL.', table_name)
+        return None
+    formato = tabla['output_format']
+    particiones = tabla['partition_by']
+    ubicacion = f"s3://{tabla['bucket_name']}/{table_name}/"
+    columnas = ',\n'.join(f'  `{campo.name}` {tipo_hive(campo.type, formato)}'
+                          for campo in esquema if campo.name not in particiones)
+    nombre_athena = f'`{ATHENA_DATABASE}`.`{table_name.lower()}`'
+    sentencia = [f'CREATE EXTERNAL TABLE IF NOT EXISTS {nombre_athena} (', columnas, ')']
+    propiedades = {}
+    if particiones:
+        sentencia.append('PARTITIONED BY (' + ', '.join(f'`{c}` string' for c in particiones) + ')')
+        valores = particiones_existentes(tabla)
+        propiedades['projection.enabled'] = 'true'
+        for columna in particiones:
+            if columna == 'dt':
+                desde = min(valores['dt'], default=None) or datetime.now(timezone.utc).strftime('%Y-%m-%d')
+                propiedades.update({
+                    'projection.dt.type': 'date',
+                    'projection.dt.format': 'yyyy-MM-dd',
+                    'projection.dt.range': f'{desde},NOW',
+                    'projection.dt.interval': '1',
+                    'projection.dt.interval.unit': 'DAYS',
+                })
+            elif valores[columna]:
+                propiedades[f'projection.{columna}.type'] = 'enum'
+                propiedades[f'projection.{columna}.values'] = ','.join(sorted(valores[columna]))
+            else:
+                # Sin valores conocidos, las consultas deben filtrar la columna por igualdad.
+                warning(f'No hay particiones {columna}= en S3; se proyecta como injected.', table_name)
+                propiedades[f'projection.{columna}.type'] = 'injected'
+        propiedades['storage.location.template'] = ubicacion + '/'.join(
+            f'{columna}=${{{columna}}}' for columna in particiones) + '/'
+    sentencia += [FORMATOS_DDL[formato], f"LOCATION '{ubicacion}'"]
+    if not propiedades:
+        return '\n'.join(sentencia) + ';'
+    lista = 'TBLPROPERTIES (\n' + ',\n'.join(f"  '{clave}'='{valor}'" for clave, valor in propiedades.items()) + '\n)'
+    sentencia.append(lista)
+    return '\n'.join(sentencia) + ';\n\n' + f'ALTER TABLE {nombre_athena} SET {lista};'
+
+def valores_de_particion(objetos, columna):
+    prefijo = f'{columna}='
+    return {directorio[len(prefijo):] for key in objetos for directorio in key.split('/')[1:-1]
+            if directorio.startswith(prefijo)}
+
+def preparar_run(tabla, resume):
+    table_name = tabla['table_name']
+    total_segments = tabla['scan_segments']
+    incremental_column = tabla['incremental_column']
+    if resume:
+        estado_run = leer_json(estado_run_uri(tabla))
+        if not estado_run:
+            warning('No hay un escaneo previo que reanudar; se inicia uno nuevo.', table_name)
+        elif estado_run['total_segments'] != total_segments:
+            critical(f"El escaneo previo usó {estado_run['total_segments']} segmentos y scan_segments es "
+                     f"{total_segments}.", table_name)
+            exit_program(True)
+        else:
+            run = dict(estado_run['run'], reanudado=True, anteriores=objetos_reutilizables(tabla))
+            estados = [leer_json(estado_segmento_uri(tabla, segment)) for segment in range(total_segments)]
+            info(f"Reanudando el escaneo {run['run_id']}.", table_name)
+            return run, estados
+
+    run = {
+        'run_id': datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ'),
+        'watermark': None,
+    }
+    if incremental_column:
+        checkpoint = leer_json(tabla['checkpoint_uri'])
+        if checkpoint.get('column') == incremental_column:
+            run['watermark'] = checkpoint.get('watermark')
+        if run['watermark'] is not None:
+            info(f"Modo incremental: ingiriendo registros con {incremental_column} > "
+                 f"{valor_watermark(run['watermark'])}.", table_name)
+        else:
+            info('Modo incremental sin checkpoint previo: se ingiere la tabla completa.', table_name)
+    for segment in range(total_segments):
+        borrar_json(estado_segmento_uri(tabla, segment))
+    guardar_json(estado_run_uri(tabla), {
+        'table': table_name,
+        'total_segments': total_segments,
+        'run': run,
+    })
+    run['anteriores'] = objetos_reutilizables(tabla)
+    return run, [{} for _ in range(total_segments)]
+
+def limpiar_estado_scan(tabla, resultados):
+    if any(r['fallos'] for r in resultados):
+        warning(f"Hubo errores al subir a S3; se conserva el estado en {tabla['scan_state_uri']} para usar --resume.",
+                tabla['table_name'])
+        return
+    for segment in range(tabla['scan_segments']):
+        borrar_json(estado_segmento_uri(tabla, segment))
+    borrar_json(estado_run_uri(tabla))
+
+def tope_watermark(tabla, run, watermark):
+    """Valor de incremental_column hasta el que el run vio con seguridad todos los items.
+
+    Un item escrito durante el scan en un segmento que ya se leyó no aparece en
+    este run; si el watermark avanzara hasta el máximo visto, tampoco lo leería
+    ninguno de los siguientes. Por eso se confirma a lo sumo el inicio del run
+    (el run_id) menos incremental_overlap_seconds, que cubre relojes desfasados
+    de quienes escriben. El tope se expresa en el formato de watermark: epoch
+    en segundos, milisegundos, microsegundos o nanosegundos si es un número, o
+    fecha ISO 8601 en UTC si es texto. Devuelve None si no reconoce el formato.
+    """
+    tope = datetime.strptime(run['run_id'], '%Y%m%dT%H%M%SZ').replace(tzinfo=timezone.utc).timestamp()
+    tope -= tabla['incremental_overlap_seconds']
+    if 'N' in watermark:
+        # Las unidades se distinguen por magnitud: 10**11 segundos son el año 5138.
+        magnitud = abs(valor_watermark(watermark))
+        factor = next(10 ** (3 * n) for n in range(4) if n == 3 or magnitud < 10 ** (11 + 3 * n))
+        return {'N': str(int(tope) * factor)}
+    valor = watermark.get('S') or ''
+    if not re.match(r'\d{4}-\d{2}-\d{2}', valor):
+        return None
+    fecha = datetime.fromtimestamp(tope, timezone.utc)
+    if len(valor) == 10:
+        # Con solo la fecha, el último día completo es el anterior al tope.
+        return {'S': (fecha - timedelta(days=1)).strftime('%Y-%m-%d')}
+    return {'S': fecha.strftime(f'%Y-%m-%d{valor[10]}%H:%M:%S')}
+
+def actualizar_checkpoint(tabla, run, resultados):
+    table_name = tabla['table_name']
+    if any(r['fallos'] for r in resultados):
+        warning('Hubo errores al subir a S3; el checkpoint incremental no se actualiza.', table_name)
+        return
+    watermark = None
+    for resultado in resultados:
+        watermark = max_watermark(watermark, resultado['watermark'])
+    if watermark is not None:
+        tope = tope_watermark(tabla, run, watermark)
+        if tope is None:
+            warning(f"{tabla['incremental_column']} no es un epoch ni una fecha ISO 8601; el watermark avanza hasta "
+                    f"el máximo visto y los items escritos durante el scan pueden no ingerirse.", table_name)
+        elif valor_watermark(watermark) > valor_watermark(tope):
+            watermark = tope
+    # Nunca retrocede respecto del checkpoint anterior.
+    watermark = max_watermark(run['watermark'], watermark)
+    guardar_json(tabla['checkpoint_uri'], {
+        'table': table_name,
+        'column': tabla['incremental_column'],
+        'watermark': watermark,
+        'run_id': run['run_id'],
+    })
+    info(f"Checkpoint incremental actualizado en {tabla['checkpoint_uri']}: "
+         f"{valor_watermark(watermark) if watermark else 'sin watermark'}.", table_name)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingesta de las tablas del manifiesto desde DynamoDB hacia S3.")
+    parser.add_argument('--resume', action='store_true',
+                        help='Continúa el último escaneo interrumpido de cada tabla desde su último checkpoint.')
+    parser.add_argument('--compactar', action='store_true',
+                        help='No escanea: une los objetos pequeños existentes bajo {table_name}/ '
+                             'en objetos de target_object_mb.')
+    parser.add_argument('--ddl', action='store_true',
+                        help='No escanea: imprime el DDL de Athena con partition projection de cada tabla '
+                             '(CREATE y el ALTER TABLE que actualiza los valores de partición; ejecutar '
+                             'después de cada ingesta que agregue tenants).')
+    parser.add_argument('--tabla', action='append', metavar='TABLE_NAME',
+                        help='Procesa solo esta tabla del manifiesto (se puede repetir).')
+    args = parser.parse_args()
+
+    tablas = TABLAS
+    if args.tabla:
+        desconocidas = set(args.tabla) - {tabla['table_name'] for tabla in TABLAS}
+        if desconocidas:
+            critical(f'Tablas que no están en el manifiesto: {sorted(desconocidas)}')
+            exit_program(True)
+        tablas = [tabla for tabla in TABLAS if tabla['table_name'] in args.tabla]
+
+    if args.ddl:
+        for tabla in tablas:
+            ddl = generar_ddl(tabla)
+            if ddl:
+                print(ddl + '\n')
+    elif args.compactar:
+        for tabla in tablas:
+            compactar(tabla, f"{tabla['table_name']}/")
+    else:
+        inicio = time.time()
+        trabajos = [(tabla, *preparar_run(tabla, args.resume)) for tabla in tablas]
+        fallidas = ejecutar_tablas(trabajos)
+        guardar_metricas(inicio, tablas, fallidas)
+        if fallidas:
+            critical(f'Tablas que no se completaron: {sorted(fallidas)}')
+            exit_program(True)
+        info(f'Proceso completado. Tablas procesadas: {len(tablas)}')
+    exit_program(False)
@@ -0,0 +1,184 @@
+"""Métricas en proceso: contadores, valores y tiempos por etapa, con etiquetas.
+
+Cada evento suma en un diccionario bajo un lock (sin guardar muestras), así que
+el costo es de microsegundos por página, lote o chunk y se puede dejar activo
+en producción. Los tiempos se acumulan además en cubetas fijas, como un
+histograma de Prometheus, para estimar percentiles. Al final de la ejecución se escriben como resumen JSON y,
+opcionalmente, en el formato de texto de Prometheus para el textfile collector
+de node_exporter o para un Pushgateway.
+
+Hay una copia de este módulo en ingesta/ y otra en etl/ porque cada servicio se
+construye con su propio contexto de Docker.
+"""
+import json
+import os
+import threading
+from bisect import bisect_left
+import time
+import urllib.request
+from contextlib import contextmanager
+
+# Límites superiores, en segundos, de las cubetas de los tiempos; la última
+# cubeta (sin límite) junta lo que supera a LIMITES[-1].
+LIMITES = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+def clave(nombre, etiquetas):
+    return nombre, tuple(sorted(etiquetas.items()))
+
+
+def escribir_atomico(path, texto):
+    # El textfile collector puede leer el archivo en cualquier momento.
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_file = f"{path}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        f.write(texto)
+    os.replace(tmp_file, path)
+
+
+def percentil(cubetas, q, maximo):
+    """Estima el percentil q (entre 0 y 1) interpolando dentro de la cubeta, como
+    histogram_quantile de Prometheus. Nunca devuelve más que maximo.
+    """
+    objetivo = q * sum(cubetas)
+    acumulado = 0
+    for i, n in enumerate(cubetas):
+        if n and acumulado + n >= objetivo:
+            if i == len(LIMITES):
+                return maximo
+            inferior = LIMITES[i - 1] if i else 0.0
+            return min(inferior + (LIMITES[i] - inferior) * (objetivo - acumulado) / n, maximo)
+        acumulado += n
+    return 0.0
+
+
+def etiquetas_prometheus(etiquetas):
+    if not etiquetas:
+        return ''
+    valores = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in etiquetas.values())
+    return '{' + ','.join(f'{k}="{v}"' for k, v in zip(etiquetas, valores)) + '}'
+
+
+class Metricas:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.contadores = {}
+        self.valores = {}
+        self.tiempos = {}
+
+    def sumar(self, nombre, valor=1, **etiquetas):
+        k = clave(nombre, etiquetas)
+        with self.lock:
+            self.contadores[k] = self.contadores.get(k, 0) + valor
+
+    def fijar(self, nombre, valor, **etiquetas):
+        with self.lock:
+            self.valores[clave(nombre, etiquetas)] = valor
+
+    def observar(self, nombre, segundos, cantidad=1, maximo=None, cubetas=None, **etiquetas):
+        # cantidad > 1 registra varios eventos que sumaron segundos; sin cubetas
+        # se cuentan todos en la cubeta del promedio.
+        k = clave(nombre, etiquetas)
+        with self.lock:
+            n, total, mayor, acumuladas = self.tiempos.get(k, (0, 0.0, 0.0, [0] * (len(LIMITES) + 1)))
+            if cubetas is None:
+                acumuladas[bisect_left(LIMITES, segundos / cantidad)] += cantidad
+            else:
+                acumuladas = [a + b for a, b in zip(acumuladas, cubetas)]
+            self.tiempos[k] = (n + cantidad, total + segundos, max(mayor, segundos if maximo is None else maximo),
+                               acumuladas)
+
+    @contextmanager
+    def medir(self, nombre, **etiquetas):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nombre, time.perf_counter() - inicio, **etiquetas)
+
+    def iterar(self, iterable, nombre, **etiquetas):
+        # Mide lo que tarda cada elemento en producirse, no lo que el consumidor
+        # hace con él.
+        iterador = iter(iterable)
+        while True:
+            inicio = time.perf_counter()
+            try:
+                elemento = next(iterador)
+            except StopIteration:
+                return
+            self.observar(nombre, time.perf_counter() - inicio, **etiquetas)
+            yield elemento
+
+    def exportar(self):
+        with self.lock:
+            return {
+                'contadores': [{'nombre': n, 'etiquetas': dict(e), 'valor': v}
+                               for (n, e), v in sorted(self.contadores.items())],
+                'valores': [{'nombre': n, 'etiquetas': dict(e), 'valor': v}
+                            for (n, e), v in sorted(self.valores.items())],
+                'tiempos': [{'nombre': n, 'etiquetas': dict(e), 'cantidad': c, 'segundos': round(s, 6),
+                             'maximo': round(m, 6), 'p50': round(percentil(cubetas, 0.5, m), 6),
+                             'p95': round(percentil(cubetas, 0.95, m), 6), 'p99': round(percentil(cubetas, 0.99, m), 6),
+                             'cubetas': list(cubetas)}
+                            for (n, e), (c, s, m, cubetas) in sorted(self.tiempos.items())],
+            }
+
+    def fusionar(self, datos):
+        """Suma lo exportado por otra instancia (por ejemplo, de un proceso hijo)."""
+        for c in datos['contadores']:
+            self.sumar(c['nombre'], c['valor'], **c['etiquetas'])
+        for v in datos['valores']:
+            self.fijar(v['nombre'], v['valor'], **v['etiquetas'])
+        for t in datos['tiempos']:
+            self.observar(t['nombre'], t['segundos'], t['cantidad'], t['maximo'], t.get('cubetas'), **t['etiquetas'])
+
+    def a_prometheus(self, prefijo):
+        datos = self.exportar()
+        lineas = []
+        tipos = set()
+
+        def tipo(nombre, valor):
+            if nombre not in tipos:
+                tipos.add(nombre)
+                lineas.append(f'# TYPE {nombre} {valor}')
+
+        for c in datos['contadores']:
+            nombre = f"{prefijo}_{c['nombre']}_total"
+            tipo(nombre, 'counter')
+            lineas.append(f"{nombre}{etiquetas_prometheus(c['etiquetas'])} {c['valor']}")
+        for v in datos['valores']:
+            nombre = f"{prefijo}_{v['nombre']}"
+            tipo(nombre, 'gauge')
+            lineas.append(f"{nombre}{etiquetas_prometheus(v['etiquetas'])} {v['valor']}")
+        for t in datos['tiempos']:
+            nombre = f"{prefijo}_{t['nombre']}_seconds"
+            etiquetas = etiquetas_prometheus(t['etiquetas'])
+            tipo(nombre, 'histogram')
+            acumulado = 0
+            for limite, n in zip(LIMITES + ('+Inf',), t['cubetas']):
+                acumulado += n
+                lineas.append(f"{nombre}_bucket{etiquetas_prometheus(dict(t['etiquetas'], le=limite))} {acumulado}")
+            lineas.append(f"{nombre}_sum{etiquetas} {t['segundos']}")
+            lineas.append(f"{nombre}_count{etiquetas} {t['cantidad']}")
+        for t in datos['tiempos']:
+            nombre = f"{prefijo}_{t['nombre']}_seconds_max"
+            tipo(nombre, 'gauge')
+            lineas.append(f"{nombre}{etiquetas_prometheus(t['etiquetas'])} {t['maximo']}")
+        return '\n'.join(lineas) + '\n'
+
+    def guardar(self, prefijo, json_path, prom_path=None, pushgateway_url=None, **resumen):
+        """Escribe el resumen JSON y, si se indican, el textfile de Prometheus y el push.
+
+        resumen agrega campos de primer nivel al JSON (inicio, duración, tablas...).
+        """
+        escribir_atomico(json_path, json.dumps(dict(resumen, **self.exportar()), ensure_ascii=False, indent=2))
+        if not prom_path and not pushgateway_url:
+            return
+        texto = self.a_prometheus(prefijo)
+        if prom_path:
+            escribir_atomico(prom_path, texto)
+        if pushgateway_url:
+            request = urllib.request.Request(f"{pushgateway_url.rstrip('/')}/metrics/job/{prefijo}",
+                                             data=texto.encode('utf-8'), method='PUT',
+                                             headers={'Content-Type': 'text/plain; version=0.0.4'})
+            urllib.request.urlopen(request, timeout=10).close()